@@ -0,0 +1,151 @@
+import itertools
+import concurrent.futures
+
+# Tasks kept in flight per worker: enough to never starve the pool, while memory
+# stays flat no matter how many files a folder holds
+IN_FLIGHT_PER_WORKER = 3
+
+# Files per task submitted to the process pool
+PROCESS_CHUNKSIZE = 16
+
+def _completed(futures):
+    """Waits for at least one future and pops `(payload, result)` for every finished one."""
+    done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+    return [(futures.pop(future), future.result()) for future in done]
+
+def bounded_map(executor, fn, items, window):
+    """Yields `(item, fn(item))` as tasks complete, pulling `items` lazily.
+
+    At most `window` tasks are submitted at any time, so neither the Future
+    objects nor the item iterator are ever materialized in full.
+    """
+    items = iter(items)
+    futures = {executor.submit(fn, item): item for item in itertools.islice(items, window)}
+    while futures:
+        finished = _completed(futures)
+        for item in itertools.islice(items, len(finished)):
+            futures[executor.submit(fn, item)] = item
+        yield from finished
+
+def adaptive_map(executor, fn, items, controller):
+    """Like `bounded_map`, but keeps `controller.limit` tasks in flight and reports
+    completions back to it (see concurrency.AdaptiveConcurrency)."""
+    items = iter(items)
+    controller.restart()
+    futures = {executor.submit(fn, item): item for item in itertools.islice(items, controller.limit)}
+    while futures:
+        finished = _completed(futures)
+        controller.completed(len(finished))
+        for item in itertools.islice(items, max(0, controller.limit - len(futures))):
+            futures[executor.submit(fn, item)] = item
+        yield from finished
+
+def thread_map(fn, items, max_workers, controller=None):
+    """Yields `(item, fn(item))` from a thread pool as tasks complete.
+
+    With a `controller` the pool grows up to `controller.maximum` threads and the
+    number of tasks in flight follows `controller.limit`; otherwise `max_workers`
+    threads with a fixed window.
+    """
+    workers = controller.maximum if controller else max_workers
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        if controller:
+            yield from adaptive_map(executor, fn, items, controller)
+        else:
+            yield from bounded_map(executor, fn, items, max_workers * IN_FLIGHT_PER_WORKER)
+
+def hash_in_threads(hash_fn, files, cache, max_workers, controller=None):
+    """Yields `(path, hash)` pairs, calling `hash_fn(path, cache)` in a thread pool."""
+    yield from thread_map(lambda file_path: hash_fn(file_path, cache), files, max_workers, controller)
+
+class InputOrder:
+    """Wraps a file iterator so a backend's out-of-order results can be re-emitted in input order.
+
+    Pass the wrapper to a backend as its `files`, then iterate `release(results)`.
+    Each result is held until every earlier file has finished; only `(path,
+    hash)` pairs wait, so a slow file delays results without stalling hashing.
+    """
+
+    def __init__(self, files):
+        self.files = files
+        self._order = {}
+
+    def __iter__(self):
+        for seq, file_path in enumerate(self.files):
+            self._order[file_path] = seq
+            yield file_path
+
+    def release(self, results):
+        pending, next_seq = {}, 0
+        for file_path, img_hash in results:
+            pending[self._order.pop(file_path)] = (file_path, img_hash)
+            while next_seq in pending:
+                yield pending.pop(next_seq)
+                next_seq += 1
+
+class SourceTags:
+    """Wraps an iterator of `(source, path)` pairs so one backend can hash files from several sources.
+
+    The backend sees plain paths; `tag(results)` turns its `(path, hash)` pairs
+    back into `(source, path, hash)`. Only files in flight are remembered.
+    """
+
+    def __init__(self, tagged_files):
+        self.tagged_files = tagged_files
+        self._sources = {}
+
+    def __iter__(self):
+        for source, file_path in self.tagged_files:
+            self._sources[file_path] = source
+            yield file_path
+
+    def source(self, file_path):
+        return self._sources[file_path]
+
+    def tag(self, results):
+        for file_path, img_hash in results:
+            yield self._sources.pop(file_path), file_path, img_hash
+
+def _digest_chunk(digest_fn, paths):
+    return [digest_fn(path) for path in paths]
+
+def hash_in_processes(digest_fn, files, cache, max_workers):
+    """Yields `(path, hash)` pairs, calling `digest_fn(path)` in a process pool.
+
+    Cache lookups and writes stay in the parent; workers only return raw digest
+    bytes, and files are submitted in chunks to keep IPC overhead low.
+    """
+    def results(finished):
+        for chunk, digests in finished:
+            for (file_path, st), digest in zip(chunk, digests):
+                img_hash = digest.hex() if digest else None
+                if img_hash and cache:
+                    cache.put(st, img_hash)
+                yield file_path, img_hash
+
+    window = max_workers * IN_FLIGHT_PER_WORKER
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures, chunk = {}, []
+        for file_path in files:
+            st = None
+            if cache:
+                try:
+                    cached, st = cache.get(file_path)
+                except OSError:
+                    yield file_path, None
+                    continue
+                if cached:
+                    yield file_path, cached
+                    continue
+
+            chunk.append((file_path, st))
+            if len(chunk) == PROCESS_CHUNKSIZE:
+                futures[executor.submit(_digest_chunk, digest_fn, [p for p, _ in chunk])] = chunk
+                chunk = []
+                while len(futures) >= window:
+                    yield from results(_completed(futures))
+
+        if chunk:
+            futures[executor.submit(_digest_chunk, digest_fn, [p for p, _ in chunk])] = chunk
+        while futures:
+            yield from results(_completed(futures))
@@ -0,0 +1,33 @@
+"""Compares the thread and process hashing backends on the same folder.
+
+Usage: python -m benchmarks.bench_backends ./C
+"""
+import os
+import sys
+import time
+import one_folder
+
+def run(folder, backend):
+    one_folder.HASH_BACKEND = backend
+    one_folder.USE_HASH_CACHE = False  # Always measure real decodes
+    start_wall, start_cpu = time.perf_counter(), cpu_seconds()
+    _, total = one_folder.process_images(folder)
+    wall = time.perf_counter() - start_wall
+    return total, wall, cpu_seconds() - start_cpu
+
+def cpu_seconds():
+    """CPU time of this process plus its reaped children (the process pool workers)."""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+def main(folder):
+    results = {backend: run(folder, backend) for backend in ("threads", "processes")}
+
+    print("\n📊 Hashing backend comparison")
+    for backend, (total, wall, cpu) in results.items():
+        rate = total / wall if wall else 0
+        utilization = 100 * cpu / wall if wall else 0
+        print(f"{backend:>10}: {total} files in {wall:.2f}s ({rate:.1f} files/s, {utilization:.0f}% CPU)")
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "./C")
@@ -0,0 +1,38 @@
+"""Measures the NumPy Hamming-distance engine on random 64-bit hashes.
+
+All pairs are searched at 100k hashes. At 1M and 5M hashes a sample of query
+blocks is timed and the full all-pairs time is extrapolated from it.
+
+Usage: python -m benchmarks.bench_hamming [threshold]
+"""
+import sys
+import time
+import numpy as np
+from hamming import HammingIndex, QUERY_BLOCK
+
+SIZES = (100_000, 1_000_000, 5_000_000)
+SAMPLE_BLOCKS = 4
+
+def main(threshold):
+    rng = np.random.default_rng(0)
+    print(f"📊 Hamming search, threshold {threshold} bits, popcount via "
+          f"{'np.bitwise_count' if hasattr(np, 'bitwise_count') else 'byte LUT'}")
+
+    for n in SIZES:
+        index = HammingIndex(rng.integers(0, 2**64, size=n, dtype=np.uint64))
+        start = time.perf_counter()
+        if n <= SIZES[0]:
+            pairs = sum(1 for _ in index.pairs_within(threshold))
+            elapsed = time.perf_counter() - start
+            comparisons = n * (n - 1) / 2
+            print(f"{n:>10,}: {elapsed:8.2f}s all pairs, {comparisons / elapsed / 1e9:.2f}G comparisons/s, {pairs} pairs")
+        else:
+            for q0 in range(0, SAMPLE_BLOCKS * QUERY_BLOCK, QUERY_BLOCK):
+                index.query(index.hashes[q0:q0 + QUERY_BLOCK], threshold)
+            elapsed = time.perf_counter() - start
+            rate = SAMPLE_BLOCKS * QUERY_BLOCK * n / elapsed
+            estimate = n * (n - 1) / 2 / rate
+            print(f"{n:>10,}: {rate / 1e9:.2f}G comparisons/s, ~{estimate / 60:.1f} min estimated for all pairs")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 6)
@@ -0,0 +1,39 @@
+"""Compares full-resolution and reduced decoding for perceptual hashing.
+
+Speedups are reported per file extension as well: PNG has no reduced decode,
+and HEICs only have one when they embed a thumbnail.
+
+Usage: python -m benchmarks.bench_perceptual ./C
+"""
+import os
+import sys
+import time
+from collections import defaultdict
+import one_folder  # Registers the HEIF opener
+from perceptual import dhash
+
+def run(paths, reduced):
+    """Returns total seconds and seconds per extension."""
+    by_ext = defaultdict(float)
+    for path in paths:
+        start = time.perf_counter()
+        dhash(path, reduced)
+        by_ext[os.path.splitext(path)[1].lower()] += time.perf_counter() - start
+    return sum(by_ext.values()), by_ext
+
+def main(folder):
+    paths = one_folder.list_images(folder)
+    full, full_by_ext = run(paths, reduced=False)
+    reduced, reduced_by_ext = run(paths, reduced=True)
+
+    print(f"\n📊 dHash over {len(paths)} images")
+    print(f"   full decode: {full:.2f}s ({len(paths) / full if full else 0:.1f} images/s)")
+    print(f"reduced decode: {reduced:.2f}s ({len(paths) / reduced if reduced else 0:.1f} images/s)")
+    if reduced:
+        print(f"       speedup: {full / reduced:.1f}x")
+    for ext in sorted(full_by_ext):
+        if reduced_by_ext[ext]:
+            print(f"{ext:>14}: {full_by_ext[ext] / reduced_by_ext[ext]:.1f}x")
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "./C")
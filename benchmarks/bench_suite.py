@@ -0,0 +1,182 @@
+"""Benchmarks the main pipeline functions on a synthetic corpus (see benchmarks/corpus.py).
+
+Each benchmark runs in a fresh process so peak RSS is its own, and reports
+files/s, MB/s, peak RSS and CPU utilization (CPU time / wall time, so 400%
+means four busy cores). Results are written to JSON; pass an earlier results
+file to print the change against it.
+
+An existing corpus under corpus_root is reused; otherwise one is generated.
+
+Usage: python -m benchmarks.bench_suite [corpus_root] [results.json] [baseline.json]
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import tempfile
+import platform
+import subprocess
+import contextlib
+import multiprocessing
+import concurrent.futures
+from benchmarks.corpus import load_or_generate
+
+CORPUS_IMAGES = 200
+CORPUS_SEED = 0
+
+# Force real byte copies so MB/s measures I/O ("auto" may reflink instead)
+COPY_STRATEGY = "copy"
+
+def cpu_seconds():
+    """CPU time of this process plus its reaped children (e.g. process pool workers)."""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+def peak_rss():
+    """Peak resident set size in bytes of this process or any reaped child."""
+    scale = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is KiB on Linux
+    return scale * max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+def total_size(paths):
+    return sum(os.path.getsize(path) for path in paths)
+
+# Each benchmark does its setup and returns `(files, bytes, work)`; only `work()` is timed
+
+def bench_get_image_hash(corpus, scratch):
+    import one_folder
+    paths = one_folder.list_images(os.path.join(corpus, "C"))
+    return len(paths), total_size(paths), lambda: [one_folder.get_image_hash(path) for path in paths]
+
+def bench_process_images(corpus, scratch):
+    import one_folder
+    paths = one_folder.list_images(os.path.join(corpus, "C"))
+    return len(paths), total_size(paths), lambda: one_folder.process_images(os.path.join(corpus, "C"))
+
+def bench_copy_image(corpus, scratch):
+    import one_folder
+    paths = one_folder.list_images(os.path.join(corpus, "C"))
+    dest = os.path.join(scratch, "copies")
+
+    def work():
+        with concurrent.futures.ThreadPoolExecutor(max_workers=one_folder.MAX_THREADS) as executor:
+            list(executor.map(lambda item: one_folder.copy_image(item[1], dest, item[0], len(paths)), enumerate(paths)))
+    return len(paths), total_size(paths), work
+
+def bench_clean_up_videos(corpus, scratch):
+    import one_folder
+    # clean_up_videos deletes and moves files, so it runs on a linked copy of C
+    # (a real copy when the scratch directory is on another filesystem, e.g. a tmpfs /tmp)
+    folder = os.path.join(scratch, "C")
+    os.makedirs(folder)
+    for entry in os.scandir(os.path.join(corpus, "C")):
+        try:
+            os.link(entry.path, os.path.join(folder, entry.name))
+        except OSError:
+            shutil.copy2(entry.path, os.path.join(folder, entry.name))
+    videos = [entry.path for entry in os.scandir(folder) if os.path.splitext(entry.name)[1].lower() in one_folder.VIDEO_EXTENSIONS]
+    return len(os.listdir(folder)), total_size(videos), lambda: one_folder.clean_up_videos(folder, os.path.join(scratch, "videos"))
+
+def bench_compare_images_and_sort(corpus, scratch):
+    import two_folders
+    folder_a, folder_b = os.path.join(corpus, "A"), os.path.join(corpus, "B")
+    paths = two_folders.list_images(folder_a) + two_folders.list_images(folder_b)
+    return len(paths), total_size(paths), lambda: two_folders.compare_images_and_sort(folder_a, folder_b, os.path.join(scratch, "output"))
+
+BENCHMARKS = {
+    "get_image_hash": bench_get_image_hash,
+    "process_images": bench_process_images,
+    "copy_image": bench_copy_image,
+    "clean_up_videos": bench_clean_up_videos,
+    "compare_images_and_sort": bench_compare_images_and_sort,
+}
+
+def run_one(name, corpus, scratch):
+    """Runs one benchmark in the current process and returns its metrics."""
+    import one_folder, two_folders
+    from progress import progress
+    for module in (one_folder, two_folders):
+        module.USE_HASH_CACHE = False  # Always measure real decodes
+        module.COPY_STRATEGY = COPY_STRATEGY
+    progress.configure(quiet=True)
+
+    os.makedirs(scratch)
+    files, size, work = BENCHMARKS[name](corpus, scratch)
+    start_wall, start_cpu = time.perf_counter(), cpu_seconds()
+    with contextlib.redirect_stdout(io.StringIO()):
+        work()
+    wall, cpu = time.perf_counter() - start_wall, cpu_seconds() - start_cpu
+
+    return {
+        "files": files,
+        "bytes": size,
+        "seconds": wall,
+        "files_per_s": files / wall if wall else 0,
+        "mb_per_s": size / 1e6 / wall if wall else 0,
+        "peak_rss_mb": peak_rss() / 1e6,
+        "cpu_percent": 100 * cpu / wall if wall else 0,
+    }
+
+def _child(name, corpus, scratch, results):
+    results.put(run_one(name, corpus, scratch))
+
+def run_isolated(name, corpus, scratch):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    child = ctx.Process(target=_child, args=(name, corpus, scratch, results))
+    child.start()
+    result = results.get()
+    child.join()
+    return result
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(results, baseline=None):
+    print("\n📊 Benchmark results")
+    print(f"{'benchmark':>24} {'files/s':>9} {'MB/s':>8} {'peak RSS':>10} {'CPU':>6}")
+    for name, r in results.items():
+        line = f"{name:>24} {r['files_per_s']:9.1f} {r['mb_per_s']:8.1f} {r['peak_rss_mb']:8.0f}MB {r['cpu_percent']:5.0f}%"
+        if baseline and name in baseline and baseline[name]["files_per_s"]:
+            line += f"  ({r['files_per_s'] / baseline[name]['files_per_s'] - 1:+.1%} files/s vs baseline)"
+        print(line)
+
+def main(corpus, results_path, baseline_path=None):
+    manifest = load_or_generate(corpus, CORPUS_IMAGES, CORPUS_SEED)
+    corpus = os.path.abspath(corpus)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="photo-bench-") as scratch_root:
+        for name in BENCHMARKS:
+            print(f"⏱️  {name}...")
+            results[name] = run_isolated(name, corpus, os.path.join(scratch_root, name))
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "corpus": manifest,
+        "results": results,
+    }
+    with open(results_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)["results"]
+    print_results(results, baseline)
+    print(f"📄 Results written to {results_path}")
+
+if __name__ == "__main__":
+    main(
+        sys.argv[1] if len(sys.argv) > 1 else "./bench_corpus",
+        sys.argv[2] if len(sys.argv) > 2 else f"bench-{git_commit() or 'results'}.json",
+        sys.argv[3] if len(sys.argv) > 3 else None,
+    )
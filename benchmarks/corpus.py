@@ -0,0 +1,133 @@
+"""Generates a reproducible synthetic photo corpus for the benchmarks.
+
+Layout under the corpus root:
+    C/  originals plus exact copies, metadata-only variants and Live Photo MOVs
+    A/, B/  two overlapping subsets of the originals (for compare_images_and_sort)
+    corpus.json  the parameters used, so results can be tied to a corpus
+
+Usage: python -m benchmarks.corpus ./bench_corpus [images] [seed]
+"""
+import os
+import sys
+import json
+import random
+import shutil
+from PIL import Image
+from pillow_heif import register_heif_opener
+
+register_heif_opener()
+
+FORMATS = {"jpeg": (".jpg", 0.6), "png": (".png", 0.15), "heic": (".heic", 0.25)}  # extension, share
+RESOLUTIONS = [(1280, 960), (1920, 1080), (3024, 4032)]
+DUPLICATE_RATIO = 0.2      # Extra files that are byte-identical copies of an original
+METADATA_RATIO = 0.1       # Extra files with the same pixels but different EXIF
+LIVE_PHOTO_RATIO = 0.15    # Originals that get a same-named .MOV companion
+STANDALONE_VIDEOS = 5      # Videos with no matching image (moved by clean_up_videos)
+VIDEO_SIZE = 512 * 1024
+OVERLAP_RATIO = 0.5        # Share of A's originals that are also in B
+HEIC_THUMBNAIL = 320       # Longest side of the thumbnail embedded in HEICs, as phone cameras do
+
+EXIF_DATETIME_ORIGINAL = 0x9003
+
+def render(rng, size):
+    """A smooth random image: a tiny random grid upscaled, so every original has distinct pixels."""
+    grid = Image.frombytes("RGB", (8, 6), rng.randbytes(8 * 6 * 3))
+    return grid.resize(size, Image.BILINEAR)
+
+def save(img, path, fmt, taken):
+    exif = Image.Exif()
+    exif[EXIF_DATETIME_ORIGINAL] = taken
+    # Fastest encoder settings: generation time matters here, decode cost barely changes
+    if fmt == "png":
+        img.save(path, exif=exif, compress_level=1)
+    elif fmt == "heic":
+        img.save(path, quality=85, exif=exif, enc_params={"preset": "ultrafast"}, thumbnails=[HEIC_THUMBNAIL])
+    else:
+        img.save(path, quality=85, exif=exif)
+
+def write_video(rng, path):
+    """A fake QuickTime file: a valid `ftyp` box followed by random payload."""
+    with open(path, "wb") as f:
+        f.write(b"\0\0\0\x14ftypqt  \0\0\0\0qt  ")
+        f.write(rng.randbytes(VIDEO_SIZE))
+
+def generate_corpus(root, images=200, seed=0):
+    """Writes the corpus under `root` and returns its manifest."""
+    rng = random.Random(seed)
+    folder_c, folder_a, folder_b = (os.path.join(root, name) for name in ("C", "A", "B"))
+    for folder in (folder_c, folder_a, folder_b):
+        shutil.rmtree(folder, ignore_errors=True)
+        os.makedirs(folder)
+
+    formats, weights = list(FORMATS), [share for _, share in FORMATS.values()]
+    originals = []
+    counts = {"originals": 0, "duplicates": 0, "metadata_variants": 0, "live_photos": 0, "standalone_videos": 0}
+
+    for i in range(images):
+        fmt = rng.choices(formats, weights)[0]
+        name = f"IMG_{i:05d}"
+        path = os.path.join(folder_c, name + FORMATS[fmt][0])
+        img = render(rng, rng.choice(RESOLUTIONS))
+        save(img, path, fmt, f"2024:01:01 00:{i // 60 % 60:02d}:{i % 60:02d}")
+        originals.append(path)
+        counts["originals"] += 1
+
+        if rng.random() < METADATA_RATIO:
+            save(img, os.path.join(folder_c, f"{name}_edited{FORMATS[fmt][0]}"), fmt, "2025:06:15 12:00:00")
+            counts["metadata_variants"] += 1
+        if rng.random() < LIVE_PHOTO_RATIO:
+            write_video(rng, os.path.join(folder_c, name + ".MOV"))
+            counts["live_photos"] += 1
+
+    for i, src in enumerate(rng.sample(originals, round(images * DUPLICATE_RATIO))):
+        name, ext = os.path.splitext(os.path.basename(src))
+        shutil.copyfile(src, os.path.join(folder_c, f"{name}_copy{i}{ext}"))
+        counts["duplicates"] += 1
+
+    for i in range(STANDALONE_VIDEOS):
+        write_video(rng, os.path.join(folder_c, f"VID_{i:05d}.MOV"))
+        counts["standalone_videos"] += 1
+
+    # A takes the first half of the originals plus a slice of the second half, B the second half
+    half = len(originals) // 2
+    shared = round(half * OVERLAP_RATIO)
+    for src in originals[:half + shared]:
+        shutil.copyfile(src, os.path.join(folder_a, os.path.basename(src)))
+    for src in originals[half:]:
+        shutil.copyfile(src, os.path.join(folder_b, os.path.basename(src)))
+
+    manifest = {
+        "images": images,
+        "seed": seed,
+        "formats": {fmt: share for fmt, (_, share) in FORMATS.items()},
+        "resolutions": RESOLUTIONS,
+        "duplicate_ratio": DUPLICATE_RATIO,
+        "metadata_ratio": METADATA_RATIO,
+        "live_photo_ratio": LIVE_PHOTO_RATIO,
+        "overlap_ratio": OVERLAP_RATIO,
+        "heic_thumbnail": HEIC_THUMBNAIL,
+        "counts": counts,
+    }
+    with open(os.path.join(root, "corpus.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def load_or_generate(root, images=200, seed=0):
+    """Returns the manifest of the corpus under `root`, generating it first if there is none
+    (or if it was generated before HEICs carried thumbnails)."""
+    try:
+        with open(os.path.join(root, "corpus.json")) as f:
+            manifest = json.load(f)
+        if manifest.get("heic_thumbnail") == HEIC_THUMBNAIL:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    print(f"🧪 Generating {images}-image corpus in {root} (seed {seed})...")
+    return generate_corpus(root, images, seed)
+
+if __name__ == "__main__":
+    root = sys.argv[1] if len(sys.argv) > 1 else "./bench_corpus"
+    images = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    manifest = generate_corpus(root, images, seed)
+    print(f"🧪 Corpus written to {root}: {manifest['counts']}")
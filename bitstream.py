@@ -0,0 +1,225 @@
+import re
+import hashlib
+
+# Segments that determine decoded JPEG pixels: SOFn/DHT/DAC (0xC0-0xCF except JPG),
+# DQT, DRI, SOS and APP14 (Adobe colour transform). APPn/COM metadata is skipped.
+JPEG_IMAGE_MARKERS = {m for m in range(0xC0, 0xD0) if m != 0xC8} | {0xDB, 0xDD, 0xDA, 0xEE}
+
+# End of entropy-coded data: 0xFF followed by anything but stuffing, RSTn or fill
+JPEG_SCAN_END = re.compile(rb"\xff[^\x00\xd0-\xd7\xff]")
+
+def jpeg_digest(data):
+    """Hashes a JPEG's coded image segments and scan data, or returns None if unparseable."""
+    if not data.startswith(b"\xff\xd8"):
+        return None
+
+    sha = hashlib.sha256(b"jpeg-bitstream\0")
+    pos, seen_scan = 2, False
+    while pos + 2 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # Fill byte
+            pos += 1
+            continue
+        if marker == 0xD9:  # EOI; anything appended afterwards is not decoded
+            return sha.digest() if seen_scan else None
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:  # Standalone markers
+            pos += 2
+            continue
+        if pos + 4 > len(data):
+            return None
+        end = pos + 2 + int.from_bytes(data[pos + 2:pos + 4], "big")
+        if end > len(data):
+            return None
+        if marker in JPEG_IMAGE_MARKERS:
+            sha.update(data[pos:end])
+        pos = end
+
+        if marker == 0xDA:
+            match = JPEG_SCAN_END.search(data, pos)
+            if not match:
+                return None
+            sha.update(data[pos:match.start()])
+            pos, seen_scan = match.start(), True
+    return None
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+def png_digest(data):
+    """Hashes a PNG's IHDR and PLTE chunks plus the concatenated IDAT payload."""
+    sha = hashlib.sha256(b"png-bitstream\0")
+    pos, seen_idat = len(PNG_SIGNATURE), False
+    while pos + 12 <= len(data):
+        length = int.from_bytes(data[pos:pos + 4], "big")
+        chunk_type = data[pos + 4:pos + 8]
+        end = pos + 12 + length
+        if end > len(data):
+            return None
+        if chunk_type == b"IDAT":
+            # Chunk boundaries are an encoder choice; only the zlib stream matters
+            sha.update(data[pos + 8:pos + 8 + length])
+            seen_idat = True
+        elif chunk_type in (b"IHDR", b"PLTE"):
+            sha.update(data[pos + 4:pos + 8 + length])
+        elif chunk_type == b"IEND":
+            return sha.digest() if seen_idat else None
+        pos = end
+    return None
+
+def _u(data, pos, size):
+    return int.from_bytes(data[pos:pos + size], "big")
+
+def _boxes(data, start, end):
+    """Yields `(type, payload_start, box_end)` for each ISOBMFF box in `data[start:end]`."""
+    pos = start
+    while pos + 8 <= end:
+        size, box_type, header = _u(data, pos, 4), data[pos + 4:pos + 8], 8
+        if size == 1:
+            size, header = _u(data, pos + 8, 8), 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            raise ValueError(f"Truncated {box_type!r} box")
+        yield box_type, pos + header, pos + size
+        pos += size
+
+def _parse_iloc(data, pos):
+    version = data[pos]
+    offset_size, length_size = data[pos + 4] >> 4, data[pos + 4] & 0x0F
+    base_offset_size, index_size = data[pos + 5] >> 4, data[pos + 5] & 0x0F
+    pos += 6
+    id_size = 2 if version < 2 else 4
+    count = _u(data, pos, id_size)
+    pos += id_size
+
+    locations = {}
+    for _ in range(count):
+        item_id = _u(data, pos, id_size)
+        pos += id_size
+        method = 0
+        if version in (1, 2):
+            method = data[pos + 1] & 0x0F
+            pos += 2
+        data_reference_index = _u(data, pos, 2)
+        base_offset = _u(data, pos + 2, base_offset_size)
+        pos += 2 + base_offset_size
+        extent_count = _u(data, pos, 2)
+        pos += 2
+        extents = []
+        for _ in range(extent_count):
+            if version in (1, 2):
+                pos += index_size
+            extents.append((base_offset + _u(data, pos, offset_size), _u(data, pos + offset_size, length_size)))
+            pos += offset_size + length_size
+        locations[item_id] = (method, data_reference_index, extents)
+    return locations
+
+def _parse_iinf(data, start, end):
+    id_size = 2 if data[start] == 0 else 4
+    types = {}
+    for box_type, pos, _ in _boxes(data, start + 4 + id_size, end):
+        if box_type == b"infe" and data[pos] >= 2:
+            infe_id_size = 2 if data[pos] == 2 else 4
+            types[_u(data, pos + 4, infe_id_size)] = data[pos + 6 + infe_id_size:pos + 10 + infe_id_size]
+    return types
+
+def _parse_dimg(data, start, end):
+    id_size = 2 if data[start] == 0 else 4
+    refs = {}
+    for box_type, pos, _ in _boxes(data, start + 4, end):
+        if box_type == b"dimg":
+            from_id = _u(data, pos, id_size)
+            count = _u(data, pos + id_size, 2)
+            pos += id_size + 2
+            refs[from_id] = [_u(data, pos + i * id_size, id_size) for i in range(count)]
+    return refs
+
+def _parse_iprp(data, start, end):
+    """Returns `{item_id: [property box bytes, ...]}` from the ipco/ipma boxes."""
+    properties, associations = [], {}
+    for box_type, pos, box_end in _boxes(data, start, end):
+        if box_type == b"ipco":
+            properties = [data[p - 8:e] for _, p, e in _boxes(data, pos, box_end)]
+        elif box_type == b"ipma":
+            version, flags = data[pos], _u(data, pos + 1, 3)
+            id_size, index_size = (2 if version < 1 else 4), (2 if flags & 1 else 1)
+            count = _u(data, pos + 4, 4)
+            pos += 8
+            for _ in range(count):
+                item_id = _u(data, pos, id_size)
+                n = data[pos + id_size]
+                pos += id_size + 1
+                mask = 0x7FFF if index_size == 2 else 0x7F
+                associations[item_id] = [_u(data, pos + i * index_size, index_size) & mask for i in range(n)]
+                pos += n * index_size
+    return {
+        item_id: [properties[i - 1] for i in indexes if 0 < i <= len(properties)]
+        for item_id, indexes in associations.items()
+    }
+
+def heic_digest(data):
+    """Hashes the coded primary image item(s) of a HEIF container, ignoring Exif/XMP items.
+
+    Grid images are followed through their `dimg` references so every tile is
+    included. Each item contributes its type, its associated properties
+    (decoder config, size, rotation, ...) and its data extents.
+    """
+    meta = next(((pos, end) for box_type, pos, end in _boxes(data, 0, len(data)) if box_type == b"meta"), None)
+    if meta is None:
+        return None
+
+    primary, locations, types, dimg, props, idat = None, {}, {}, {}, {}, b""
+    for box_type, pos, end in _boxes(data, meta[0] + 4, meta[1]):
+        if box_type == b"pitm":
+            primary = _u(data, pos + 4, 2 if data[pos] == 0 else 4)
+        elif box_type == b"iloc":
+            locations = _parse_iloc(data, pos)
+        elif box_type == b"iinf":
+            types = _parse_iinf(data, pos, end)
+        elif box_type == b"iref":
+            dimg = _parse_dimg(data, pos, end)
+        elif box_type == b"iprp":
+            props = _parse_iprp(data, pos, end)
+        elif box_type == b"idat":
+            idat = data[pos:end]
+    if primary is None:
+        return None
+
+    sha = hashlib.sha256(b"heif-bitstream\0")
+    pending, seen = [primary], set()
+    while pending:
+        item_id = pending.pop(0)
+        if item_id in seen or item_id not in locations:
+            return None
+        seen.add(item_id)
+        method, data_reference_index, extents = locations[item_id]
+        if method not in (0, 1) or data_reference_index != 0:
+            return None
+        source = data if method == 0 else idat
+        sha.update(types.get(item_id, b""))
+        for prop in props.get(item_id, []):
+            sha.update(prop)
+        for offset, length in extents:
+            if length == 0 or offset + length > len(source):
+                return None
+            sha.update(source[offset:offset + length])
+        pending.extend(dimg.get(item_id, []))
+    return sha.digest()
+
+def bitstream_digest(data):
+    """Returns a digest of the coded image payload, or None if the format isn't supported."""
+    try:
+        if data.startswith(b"\xff\xd8"):
+            return jpeg_digest(data)
+        if data.startswith(PNG_SIGNATURE):
+            return png_digest(data)
+        if data[4:8] == b"ftyp":
+            return heic_digest(data)
+    except Exception:
+        pass
+    return None
+
+def file_bitstream_digest(image_path):
+    with open(image_path, "rb") as f:
+        return bitstream_digest(f.read())
@@ -0,0 +1,69 @@
+import math
+import struct
+
+BLOOM_SUFFIX = ".bloom"
+MAGIC = b"PHBLOOM1"
+
+# magic, number of bits, number of hash functions, item count, hash mode
+HEADER = struct.Struct("<8sQIQ16s")
+
+def is_bloom_file(path):
+    return path.endswith(BLOOM_SUFFIX)
+
+class BloomFilter:
+    """Bloom filter over image digests, small enough to ship around as a file.
+
+    Digests are already uniformly distributed SHA-256 output, so the k bit
+    positions come straight from them by double hashing; nothing is rehashed.
+    """
+
+    def __init__(self, num_bits, num_hashes, mode="pixel", bits=None, count=0):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.mode = mode
+        self.count = count
+        self.bits = bits if bits is not None else bytearray((num_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity, false_positive_rate=0.01, mode="pixel"):
+        capacity = max(1, capacity)
+        num_bits = math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        return cls(num_bits, num_hashes, mode)
+
+    def _positions(self, key):
+        digest = bytes.fromhex(key) if isinstance(key, str) else key
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        """False means definitely absent; True means present with probability ~1 - fp rate."""
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, self.num_bits, self.num_hashes, self.count, self.mode.encode()))
+            f.write(self.bits)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            magic, num_bits, num_hashes, count, mode = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a photo Bloom filter")
+            bits = bytearray(f.read())
+        return cls(num_bits, num_hashes, mode.rstrip(b"\0").decode(), bits, count)
+
+def build_bloom(images, mode, false_positive_rate=0.01):
+    """Builds a filter holding every hash of a `{hash: path}` index."""
+    bloom = BloomFilter.for_capacity(len(images), false_positive_rate, mode)
+    keys = images.sorted_digests() if hasattr(images, "sorted_digests") else images
+    for key in keys:
+        bloom.add(key)
+    return bloom
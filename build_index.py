@@ -0,0 +1,34 @@
+import os
+import sys
+from bloom import BLOOM_SUFFIX, build_bloom
+from index_file import INDEX_SUFFIX, MappedIndex, is_index_file, write_index
+from two_folders import HASH_MODE, process_images
+
+# Target false-positive rate of the Bloom filter written next to each index
+BLOOM_FALSE_POSITIVE_RATE = 0.01
+
+def save_bloom(images, mode, bloom_path):
+    bloom = build_bloom(images, mode, BLOOM_FALSE_POSITIVE_RATE)
+    bloom.save(bloom_path)
+    print(f"✅ Wrote Bloom filter for {bloom.count} images to {bloom_path} ({len(bloom.bits) / 1024 ** 2:.1f} MB)")
+
+def build_index(folder, index_path):
+    """Hashes `folder` once and saves it as a memory-mappable index plus a Bloom filter."""
+    print(f"\n🔍 Hashing images in {folder}...")
+    images = process_images(folder)
+    count = write_index(index_path, images, HASH_MODE)
+    print(f"\n✅ Wrote {count} images to {index_path}")
+    save_bloom(images, HASH_MODE, os.path.splitext(index_path)[0] + BLOOM_SUFFIX)
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else "./B"
+
+    if is_index_file(source):
+        # Only (re)build the Bloom filter of an existing index
+        index = MappedIndex(source)
+        save_bloom(index, index.mode, os.path.splitext(source)[0] + BLOOM_SUFFIX)
+    elif os.path.isdir(source):
+        index_path = sys.argv[2] if len(sys.argv) > 2 else os.path.normpath(source) + INDEX_SUFFIX
+        build_index(source, index_path)
+    else:
+        print(f"Error: `{source}` is neither a folder nor an index file.")
@@ -0,0 +1,192 @@
+import os
+import heapq
+import itertools
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+
+DIGEST_SIZE = 32
+# Entries `CompactIndexBuilder.build()` sorts at once; longer indexes are sorted in runs
+# of packed positions and merged, so no Python object per entry is alive at the same time
+BUILD_RUN = 1 << 16
+
+class PathIndex(dict):
+    """`{hash: path}` dict that keeps the lexicographically smallest path per hash.
+
+    This is the one rule for which duplicate survives, in every mode: whatever
+    order the backends finish in, the same folder always keeps the same files.
+    """
+
+    def __setitem__(self, key, path):
+        kept = self.get(key)
+        if kept is None or path < kept:
+            super().__setitem__(key, path)
+
+class DigestView:
+    """Read-only sequence over the fixed-size digests packed in a buffer (for bisect)."""
+
+    def __init__(self, buffer, count, record_size=DIGEST_SIZE, offset=0):
+        self.buffer, self.count, self.record_size, self.offset = buffer, count, record_size, offset
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        start = self.offset + i * self.record_size
+        return bytes(self.buffer[start:start + DIGEST_SIZE])
+
+class SortedDigestIndex(Mapping):
+    """Read-only `{hex digest: path}` mapping over digests stored sorted and packed.
+
+    Subclasses provide `_digests` (a `DigestView`) and `_path(i)`. Lookups are
+    binary searches, and two indexes can be compared with a linear merge.
+    """
+
+    def _find(self, key):
+        try:
+            digest = bytes.fromhex(key) if isinstance(key, str) else bytes(key)
+        except ValueError:
+            return None
+        i = bisect_left(self._digests, digest)
+        if i < len(self._digests) and self._digests[i] == digest:
+            return i
+        return None
+
+    def __getitem__(self, key):
+        i = self._find(key)
+        if i is None:
+            raise KeyError(key)
+        return self._path(i)
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def __len__(self):
+        return len(self._digests)
+
+    def __iter__(self):
+        for i in range(len(self._digests)):
+            yield self._digests[i].hex()
+
+    def items(self):
+        """Yields `(hex digest, path)` in digest order without a lookup per entry."""
+        for i in range(len(self._digests)):
+            yield self._digests[i].hex(), self._path(i)
+
+    def sorted_digests(self):
+        """Yields raw digests in ascending order."""
+        for i in range(len(self._digests)):
+            yield self._digests[i]
+
+class CompactIndex(SortedDigestIndex):
+    """In-memory sorted index: packed 32-byte digests plus prefix-compressed paths.
+
+    Paths are split into an interned directory id and a basename stored in one
+    UTF-8 blob, for roughly 50 bytes per image plus the basename instead of the
+    300+ bytes of a `{hex string: path string}` dict entry.
+    """
+
+    def __init__(self, digests, dir_ids, name_offsets, names, dirs):
+        self._buffer = digests
+        self._digests = DigestView(digests, len(dir_ids))
+        self._dir_ids = dir_ids
+        self._name_offsets = name_offsets
+        self._names = names
+        self._dirs = dirs
+
+    def _path(self, i):
+        name = self._names[self._name_offsets[i]:self._name_offsets[i + 1]].decode("utf-8", "surrogateescape")
+        return os.path.join(self._dirs[self._dir_ids[i]], name)
+
+class CompactIndexBuilder:
+    """Collects `index[hex digest] = path` assignments and packs them into a `CompactIndex`.
+
+    Like `PathIndex`, the smallest path assigned to a digest is the one kept.
+    """
+
+    def __init__(self):
+        self._digests = bytearray()
+        self._dir_ids = array("I")
+        self._name_offsets = array("Q", [0])
+        self._names = bytearray()
+        self._dir_lookup = {}
+        self._dirs = []
+
+    def __setitem__(self, key, path):
+        self._digests += bytes.fromhex(key) if isinstance(key, str) else key
+        directory, name = os.path.split(path)
+        dir_id = self._dir_lookup.get(directory)
+        if dir_id is None:
+            dir_id = self._dir_lookup[directory] = len(self._dirs)
+            self._dirs.append(directory)
+        self._dir_ids.append(dir_id)
+        self._names += name.encode("utf-8", "surrogateescape")
+        self._name_offsets.append(len(self._names))
+
+    def __len__(self):
+        return len(self._dir_ids)
+
+    def _path(self, i):
+        name = self._names[self._name_offsets[i]:self._name_offsets[i + 1]].decode("utf-8", "surrogateescape")
+        return os.path.join(self._dirs[self._dir_ids[i]], name)
+
+    def build(self):
+        view = DigestView(self._digests, len(self._dir_ids))
+        runs = [array("Q", sorted(range(start, min(start + BUILD_RUN, len(view))), key=view.__getitem__))
+                for start in range(0, len(view), BUILD_RUN)]
+
+        digests, dir_ids = bytearray(), array("I")
+        name_offsets, names = array("Q", [0]), bytearray()
+        for digest, group in itertools.groupby(heapq.merge(*runs, key=view.__getitem__), key=view.__getitem__):
+            i = next(group)
+            for j in group:  # Keep the smallest path of a duplicate digest
+                if self._path(j) < self._path(i):
+                    i = j
+            digests += digest
+            dir_ids.append(self._dir_ids[i])
+            names += self._names[self._name_offsets[i]:self._name_offsets[i + 1]]
+            name_offsets.append(len(names))
+        return CompactIndex(bytes(digests), dir_ids, name_offsets, bytes(names), self._dirs)
+
+def merge_pairs(images_a, images_b, only_a=True, only_b=True):
+    """Yields `(hex digest, path in A or None, path in B or None)` for every image in either index.
+
+    `only_a=False` / `only_b=False` leave out images found only in A / only in B,
+    and then that side is never walked: a large archive index is only probed with
+    lookups (when both flags are off, the smaller side is walked). Otherwise two
+    sorted indexes are compared with a single linear merge that reads paths
+    straight from them, and other mappings are walked with lookups into each
+    other. Either way no set or merged dict of all hashes is built.
+    """
+    sorted_pair = isinstance(images_a, SortedDigestIndex) and isinstance(images_b, SortedDigestIndex)
+    if not (sorted_pair and only_a and only_b):
+        if only_a or (not only_b and len(images_a) <= len(images_b)):
+            for h, path_a in images_a.items():
+                path_b = images_b.get(h)
+                if path_b is not None or only_a:
+                    yield h, path_a, path_b
+            if only_b:
+                for h, path_b in images_b.items():
+                    if h not in images_a:
+                        yield h, None, path_b
+        else:
+            for h, path_b in images_b.items():
+                path_a = images_a.get(h)
+                if path_a is not None or only_b:
+                    yield h, path_a, path_b
+        return
+
+    digests_a, digests_b = images_a._digests, images_b._digests
+    i = j = 0
+    while i < len(digests_a) or j < len(digests_b):
+        a = digests_a[i] if i < len(digests_a) else None
+        b = digests_b[j] if j < len(digests_b) else None
+        if b is None or (a is not None and a < b):
+            yield a.hex(), images_a._path(i), None
+            i += 1
+        elif a is None or b < a:
+            yield b.hex(), None, images_b._path(j)
+            j += 1
+        else:
+            yield a.hex(), images_a._path(i), images_b._path(j)
+            i, j = i + 1, j + 1
@@ -0,0 +1,95 @@
+import time
+import threading
+
+# Shrink hard (halve) when less than this share of RAM is still available
+MIN_FREE_MEMORY = 0.10
+# Climb in bigger steps while at least this share of CPU time is spent waiting on I/O
+HIGH_IOWAIT = 0.20
+# Throughput changes smaller than this are treated as noise
+RATE_TOLERANCE = 0.05
+
+def memory_headroom():
+    """Share of RAM still available (MemAvailable / MemTotal), or None where /proc is missing."""
+    try:
+        with open("/proc/meminfo") as f:
+            info = {line.split(":")[0]: int(line.split()[1]) for line in f}
+        return info["MemAvailable"] / info["MemTotal"]
+    except (OSError, KeyError, ValueError, ZeroDivisionError):
+        return None
+
+def cpu_times():
+    """`(iowait, total)` jiffies from /proc/stat, or None where it is missing."""
+    try:
+        with open("/proc/stat") as f:
+            fields = [int(v) for v in f.readline().split()[1:]]
+        return fields[4], sum(fields)
+    except (OSError, IndexError, ValueError):
+        return None
+
+class AdaptiveConcurrency:
+    """Feedback controller for how many tasks an executor keeps in flight.
+
+    Every `interval` seconds the completion rate is compared with the previous
+    interval: while it improves the limit keeps moving the same way, and when it
+    drops the direction reverses (hill climbing). Steps are one worker, or a
+    quarter of the limit when the system is waiting on I/O (slow disks and
+    NFS reward many outstanding reads). Low memory halves the limit at once, so
+    large HEIC decodes back off before the machine swaps.
+    """
+
+    def __init__(self, initial, maximum, minimum=1, interval=1.0, name="workers"):
+        self.minimum, self.maximum, self.interval, self.name = minimum, maximum, interval, name
+        self.limit = max(minimum, min(initial, maximum))
+        self.best_limit, self.best_rate = self.limit, 0.0
+        self.lowest, self.highest = self.limit, self.limit
+        self._direction = 1
+        self._last_rate = None
+        self._done = 0
+        self._started = time.perf_counter()
+        self._cpu = cpu_times()
+        self._lock = threading.Lock()
+
+    def restart(self):
+        """Starts a fresh measurement interval, so idle time between runs isn't counted."""
+        with self._lock:
+            self._done, self._started = 0, time.perf_counter()
+            self._last_rate = None
+
+    def completed(self, count=1):
+        """Reports finished tasks; adjusts `limit` once per interval."""
+        with self._lock:
+            self._done += count
+            now = time.perf_counter()
+            # Wait for a full round of tasks too, so slow files don't make the rate pure noise
+            if now - self._started >= self.interval and self._done >= self.limit:
+                self._adjust(self._done / (now - self._started))
+                self._done, self._started = 0, now
+
+    def _iowait(self):
+        cpu, self._cpu = self._cpu, cpu_times()
+        if cpu is None or self._cpu is None or self._cpu[1] == cpu[1]:
+            return 0.0
+        return (self._cpu[0] - cpu[0]) / (self._cpu[1] - cpu[1])
+
+    def _adjust(self, rate):
+        if rate > self.best_rate:
+            self.best_limit, self.best_rate = self.limit, rate
+
+        headroom, iowait = memory_headroom(), self._iowait()
+        if headroom is not None and headroom < MIN_FREE_MEMORY:
+            self._direction = -1
+            self.limit = max(self.minimum, self.limit // 2)
+        else:
+            if self._last_rate is not None and rate < self._last_rate * (1 - RATE_TOLERANCE):
+                self._direction = -self._direction
+            step = max(1, self.limit // 4) if self._direction > 0 and iowait >= HIGH_IOWAIT else 1
+            self.limit = max(self.minimum, min(self.maximum, self.limit + self._direction * step))
+
+        self._last_rate = rate
+        self.lowest, self.highest = min(self.lowest, self.limit), max(self.highest, self.limit)
+
+    def summary(self):
+        if not self.best_rate:
+            return f"⚙️  {self.name.capitalize()} stayed at {self.limit} in flight (run too short to measure)"
+        return (f"⚙️  {self.name.capitalize()} settled at {self.limit} in flight "
+                f"(explored {self.lowest}–{self.highest}, best {self.best_rate:.1f} files/s at {self.best_limit})")
@@ -0,0 +1,73 @@
+import os
+import heapq
+import shutil
+import struct
+import tempfile
+import itertools
+
+# digest, source id, path length; followed by the UTF-8 path
+RECORD_HEADER = struct.Struct("<32sBH")
+
+class SpillSorter:
+    """Collects `(digest, source, path)` records into sorted run files and k-way merges them.
+
+    At most `run_records` records are held in memory at once, so duplicate
+    groups and A/B membership can be found for corpora far larger than RAM.
+    """
+
+    def __init__(self, run_records=1_000_000, tmp_dir=None):
+        self.run_records = run_records
+        self.records = 0
+        self._dir = tempfile.mkdtemp(prefix="photo-spill-", dir=tmp_dir)
+        self._buffer = []
+        self._runs = []
+
+    def writer(self, source):
+        """Returns a sink for `process_images`: `sink[hex digest] = path` adds a record."""
+        return _SourceWriter(self, source)
+
+    def add(self, key, source, path):
+        digest = bytes.fromhex(key) if isinstance(key, str) else key
+        self._buffer.append((digest, source, path))
+        self.records += 1
+        if len(self._buffer) >= self.run_records:
+            self._spill()
+
+    def _spill(self):
+        if not self._buffer:
+            return
+        self._buffer.sort()
+        run_path = os.path.join(self._dir, f"run{len(self._runs):05d}")
+        with open(run_path, "wb", buffering=1024 * 1024) as f:
+            for digest, source, path in self._buffer:
+                encoded = path.encode("utf-8", "surrogateescape")
+                f.write(RECORD_HEADER.pack(digest, source, len(encoded)) + encoded)
+        self._runs.append(run_path)
+        self._buffer = []
+
+    @staticmethod
+    def _read_run(run_path):
+        with open(run_path, "rb", buffering=1024 * 1024) as f:
+            while header := f.read(RECORD_HEADER.size):
+                digest, source, length = RECORD_HEADER.unpack(header)
+                yield digest, source, f.read(length).decode("utf-8", "surrogateescape")
+
+    def merged(self):
+        """Yields every record in `(digest, source, path)` order."""
+        self._spill()
+        return heapq.merge(*(self._read_run(run_path) for run_path in self._runs))
+
+    def groups(self):
+        """Yields `(hex digest, [(source, path), ...])` for each distinct digest."""
+        for digest, records in itertools.groupby(self.merged(), key=lambda record: record[0]):
+            yield digest.hex(), [(source, path) for _, source, path in records]
+
+    def close(self):
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+class _SourceWriter:
+    def __init__(self, sorter, source):
+        self.sorter, self.source = sorter, source
+
+    def __setitem__(self, key, path):
+        self.sorter.add(key, self.source, path)
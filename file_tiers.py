@@ -0,0 +1,99 @@
+import os
+import hashlib
+import concurrent.futures
+from collections import defaultdict
+from functools import partial
+
+try:
+    import xxhash
+except ImportError:  # Optional: falls back to BLAKE2b from the standard library
+    xxhash = None
+
+HEAD_BYTES = 64 * 1024
+CHUNK_BYTES = 1024 * 1024
+
+def head_hash(path):
+    """Fast non-cryptographic hash of the first 64KB of a file."""
+    with open(path, "rb") as f:
+        data = f.read(HEAD_BYTES)
+    if xxhash:
+        return xxhash.xxh3_64_digest(data)
+    return hashlib.blake2b(data, digest_size=8).digest()
+
+def full_hash(path):
+    """Hash of the whole file's bytes."""
+    sha = xxhash.xxh3_128() if xxhash else hashlib.blake2b()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_BYTES):
+            sha.update(chunk)
+    return sha.digest()
+
+def _safe_key(key_fn, path):
+    try:
+        return key_fn(path)
+    except OSError:
+        return path  # Unreadable files never match anything
+
+class ByteIdentityTiers:
+    """Collapses byte-identical files so only one copy per group needs a pixel hash.
+
+    Tier one groups by file size, tier two by a hash of the first 64KB and tier
+    three by a hash of the whole file. A file leaves the pipeline at the first
+    tier where it has no partner; files that survive all three are byte-identical
+    to another file and skip pixel hashing entirely.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self.resolved = {"size": 0, "head": 0, "full": 0, "byte_identical": 0}
+
+    def _split(self, groups, tier, key_fn=None, executor=None):
+        """Buckets each group by `key_fn`; returns (singles, groups still colliding)."""
+        singles, colliding = [], []
+        if key_fn:
+            # Key every file of every group in one pass so the pool stays busy
+            paths = [path for group in groups for path in group]
+            keys = iter(executor.map(partial(_safe_key, key_fn), paths))
+        for group in groups:
+            if key_fn:
+                buckets = defaultdict(list)
+                for path in group:
+                    buckets[next(keys)].append(path)
+                group_buckets = buckets.values()
+            else:
+                group_buckets = [group]
+            for bucket in group_buckets:
+                if len(bucket) == 1:
+                    singles.append(bucket[0])
+                else:
+                    colliding.append(bucket)
+        self.resolved[tier] += len(singles)
+        return singles, colliding
+
+    def representatives(self, paths):
+        """Returns one path per byte-identical group (the first in sorted order)."""
+        by_size = defaultdict(list)
+        for path in sorted(paths):
+            try:
+                by_size[os.path.getsize(path)].append(path)
+            except OSError:
+                continue
+
+        representatives, groups = self._split(list(by_size.values()), "size")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            singles, groups = self._split(groups, "head", head_hash, executor)
+            representatives += singles
+            singles, groups = self._split(groups, "full", full_hash, executor)
+            representatives += singles
+
+        for group in groups:
+            representatives.append(group[0])
+            self.resolved["byte_identical"] += len(group) - 1
+        return sorted(representatives)
+
+    def summary(self):
+        r = self.resolved
+        return (
+            f"🧬 Byte tiers: {r['size']} unique by size, {r['head']} by first 64KB, "
+            f"{r['full']} by full hash, {r['byte_identical']} byte-identical copies skipped"
+        )
@@ -0,0 +1,119 @@
+import os
+import hashlib
+import sqlite3
+import threading
+
+CACHE_FILENAME = ".photo_hashes.sqlite"
+
+# Where caches go when the scanned folder can't hold one (read-only drives and shares)
+FALLBACK_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "photo_hashes")
+
+class HashCache:
+    """Persistent SQLite cache of image hashes keyed by (device, inode, size, mtime_ns)."""
+
+    def __init__(self, root, kind="pixel", filename=CACHE_FILENAME):
+        self.path = os.path.join(root, filename)
+        self.kind = kind
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "kind TEXT NOT NULL, dev INTEGER NOT NULL, ino INTEGER NOT NULL, "
+            "size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, digest TEXT NOT NULL, "
+            "PRIMARY KEY (kind, dev, ino, size, mtime_ns))"
+        )
+        self._pending = []
+        self._read_only = False
+
+    @staticmethod
+    def _key(kind, st):
+        return (kind, st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def get(self, image_path):
+        """Returns `(cached_digest_or_None, stat_result)` for a file."""
+        st = os.stat(image_path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT digest FROM hashes WHERE kind=? AND dev=? AND ino=? AND size=? AND mtime_ns=?",
+                self._key(self.kind, st),
+            ).fetchone()
+            if row:
+                self.hits += 1
+                return row[0], st
+            self.misses += 1
+        return None, st
+
+    def put(self, st, digest):
+        """Queues a digest for the file described by `st`; written on flush/close."""
+        with self._lock:
+            self._pending.append(self._key(self.kind, st) + (digest,))
+            if len(self._pending) >= 1000:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._pending and not self._read_only:
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)", self._pending)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                # e.g. an existing cache file on a read-only mount: keep reading, stop writing
+                self._read_only = True
+                print(f"⚠️ Hash cache {self.path} is not writable ({e}); new hashes won't be cached")
+        self._pending = []
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+    def summary(self):
+        return f"💾 Hash cache: {self.hits} hits, {self.misses} misses ({self.path})"
+
+class SourceCaches:
+    """Cache for hashing several folders in one pool: each file is looked up in, and
+    written to, the cache of the folder it came from (`source_of(path)` indexes `caches`)."""
+
+    def __init__(self, caches, source_of):
+        self.caches, self.source_of = caches, source_of
+
+    def get(self, image_path):
+        cache = self.caches[self.source_of(image_path)]
+        if cache is None:
+            return None, None
+        cached, st = cache.get(image_path)
+        return cached, (cache, st)
+
+    def put(self, token, digest):
+        if token:
+            cache, st = token
+            cache.put(st, digest)
+
+    def close(self):
+        for cache in self.caches:
+            if cache:
+                cache.close()
+                print(cache.summary())
+
+def open_cache(root, kind="pixel"):
+    """Opens the cache inside `root`, falling back to FALLBACK_DIR and then to no cache.
+
+    Returns None (after a warning) when neither location can hold a database.
+    """
+    try:
+        return HashCache(root, kind)
+    except (sqlite3.Error, OSError) as e:
+        error = e
+    name = hashlib.sha256(os.path.abspath(root).encode("utf-8", "surrogateescape")).hexdigest()[:16] + ".sqlite"
+    try:
+        os.makedirs(FALLBACK_DIR, exist_ok=True)
+        cache = HashCache(FALLBACK_DIR, kind, name)
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️ Can't open a hash cache for {root} ({error}; {e}); hashing without one")
+        return None
+    print(f"⚠️ Can't write a hash cache into {root} ({error}); using {cache.path}")
+    return cache
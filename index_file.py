@@ -0,0 +1,63 @@
+import os
+import mmap
+import struct
+from compact_index import DIGEST_SIZE, SortedDigestIndex, DigestView
+
+INDEX_SUFFIX = ".phidx"
+MAGIC = b"PHOTOIDX"
+VERSION = 1
+
+# magic, version, record size, record count, offset of the path blob, hash mode
+HEADER = struct.Struct("<8sIIQQ16s")
+HEADER_SIZE = 64
+RECORD = struct.Struct(f"<{DIGEST_SIZE}sQ")  # digest, offset of the path in the path blob
+
+def is_index_file(path):
+    return os.path.isfile(path) and path.endswith(INDEX_SUFFIX)
+
+def write_index(index_path, images, mode):
+    """Writes `{hex digest: path}` as a sorted, fixed-record index file.
+
+    Layout: a 64-byte header, then one 40-byte record (digest + path offset)
+    per image in digest order, then the NUL-terminated absolute paths.
+    """
+    entries = sorted((bytes.fromhex(h), os.path.abspath(path)) for h, path in images.items())
+    paths_offset = HEADER_SIZE + len(entries) * RECORD.size
+
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, len(entries), paths_offset, mode.encode()).ljust(HEADER_SIZE, b"\0"))
+        offset = 0
+        for digest, path in entries:
+            f.write(RECORD.pack(digest, offset))
+            offset += len(path.encode("utf-8", "surrogateescape")) + 1
+        for _, path in entries:
+            f.write(path.encode("utf-8", "surrogateescape") + b"\0")
+    os.replace(tmp_path, index_path)
+    return len(entries)
+
+class MappedIndex(SortedDigestIndex):
+    """Read-only `{hex digest: path}` view of an index file, memory-mapped with no load phase.
+
+    Only the pages touched by binary searches are read, so RSS stays small even
+    for a 20M-image archive.
+    """
+
+    def __init__(self, index_path):
+        self.path = index_path
+        self._file = open(index_path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, count, self._paths_offset, mode = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            raise ValueError(f"{index_path} is not a version {VERSION} photo index")
+        self.mode = mode.rstrip(b"\0").decode()
+        self._digests = DigestView(self._mm, count, RECORD.size, HEADER_SIZE)
+
+    def _path(self, i):
+        _, offset = RECORD.unpack_from(self._mm, HEADER_SIZE + i * RECORD.size)
+        start = self._paths_offset + offset
+        return self._mm[start:self._mm.find(b"\0", start)].decode("utf-8", "surrogateescape")
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
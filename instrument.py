@@ -0,0 +1,177 @@
+import os
+import csv
+import json
+import math
+import time
+import atexit
+import threading
+import contextlib
+from array import array
+from progress import progress, file_size
+
+# Stand-in for `instrument.timed(...)` when instrumentation is off
+NOT_TIMED = contextlib.nullcontext()
+
+class Laps:
+    """Splits one file's work into consecutive stages, accumulating wall time, thread CPU time and bytes.
+
+    Laps are also collected into timeline spans. Consecutive laps with the same
+    `span` name (e.g. the convert/tobytes/hash strips of one image) share one
+    span whose args hold the time of each stage inside it.
+    """
+
+    def __init__(self):
+        self.totals = {}
+        self.spans = []  # [name, start, end, {stage: seconds}]
+        self._wall, self._cpu = time.perf_counter(), time.thread_time()
+
+    def lap(self, stage, nbytes=0, span=None):
+        """Charges everything since the previous lap to `stage`."""
+        wall, cpu = time.perf_counter(), time.thread_time()
+        total = self.totals.setdefault(stage, [0.0, 0.0, 0])
+        total[0] += wall - self._wall
+        total[1] += cpu - self._cpu
+        total[2] += nbytes
+
+        name = span or stage
+        if not self.spans or self.spans[-1][0] != name:
+            self.spans.append([name, self._wall, wall, {}])
+        last = self.spans[-1]
+        last[2] = wall
+        last[3][stage] = last[3].get(stage, 0.0) + wall - self._wall
+        self._wall, self._cpu = wall, cpu
+
+class _Timed:
+    def __init__(self, instrument, stage, path, nbytes):
+        self.instrument, self.stage, self.path, self.nbytes = instrument, stage, path, nbytes
+
+    def __enter__(self):
+        if self.nbytes is None:
+            self.nbytes = file_size(self.path) or 0
+        self.laps = Laps()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.laps.lap(self.stage, self.nbytes)
+            self.instrument.record_laps(self.path, self.laps)
+
+class Instrumentation:
+    """Opt-in per-stage samples (wall time, CPU time, bytes) grouped by stage and file extension.
+
+    Every call site checks `enabled` first, so when instrumentation is off the
+    hot path costs one attribute check. When on, a table of p50/p90/p99 stage
+    times is printed at exit and raw samples can be written to a CSV file.
+
+    A trace path additionally writes every file's stage spans and every
+    `progress.stage` phase as Chrome trace events (load it in ui.perfetto.dev).
+    Events are appended with unbuffered `O_APPEND` writes, so forked process
+    pool workers inherit the descriptor and add their own spans to the file.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.samples_path = None
+        self.trace_path = None
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._registered = False
+        self._trace_fd = None
+        self._named_threads = set()
+
+    def configure(self, enabled=False, samples_path=None, trace_path=None):
+        self.enabled = enabled or bool(trace_path)
+        self.samples_path = samples_path
+        self.trace_path = trace_path
+        if trace_path:
+            self._trace_fd = os.open(trace_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+            os.write(self._trace_fd, b"[\n")
+            progress.on_stage_end = self.trace_phase
+        if self.enabled and not self._registered:
+            atexit.register(self.report)
+            self._registered = True
+
+    def timed(self, stage, path, nbytes=None):
+        """Context manager recording one `stage` sample for `path` (bytes default to its size)."""
+        return _Timed(self, stage, path, nbytes)
+
+    def record_laps(self, path, laps):
+        ext = os.path.splitext(path)[1].lower() or "(none)"
+        with self._lock:
+            for stage, (wall, cpu, nbytes) in laps.totals.items():
+                columns = self._samples.get((stage, ext))
+                if columns is None:
+                    columns = self._samples[(stage, ext)] = (array("d"), array("d"), array("d"))
+                columns[0].append(wall)
+                columns[1].append(cpu)
+                columns[2].append(nbytes)
+        if self._trace_fd is not None:
+            self._trace([
+                {"name": name, "cat": ext, "ph": "X", "ts": start * 1e6, "dur": (end - start) * 1e6,
+                 "args": {"file": path, **({f"{stage}_ms": round(1000 * seconds, 3) for stage, seconds in stages.items()} if len(stages) > 1 else {})}}
+                for name, start, end, stages in laps.spans
+            ])
+
+    def trace_phase(self, name, start, end, fields):
+        """Adds a `progress.stage` phase (hash, copy, ...) to the trace as one span."""
+        if self._trace_fd is not None:
+            self._trace([{"name": name, "cat": "phase", "ph": "X", "ts": start * 1e6, "dur": (end - start) * 1e6, "args": fields}])
+
+    def _trace(self, events):
+        pid, tid = os.getpid(), threading.get_native_id()
+        if (pid, tid) not in self._named_threads:
+            self._named_threads.add((pid, tid))
+            events.insert(0, {"name": "thread_name", "ph": "M", "args": {"name": threading.current_thread().name}})
+        for event in events:
+            event["pid"], event["tid"] = pid, tid
+        # One write per batch: O_APPEND keeps batches from different processes whole
+        os.write(self._trace_fd, "".join(json.dumps(event, default=str) + ",\n" for event in events).encode())
+
+    def summary(self):
+        lines = [f"{'stage':>10} {'ext':>6} {'count':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'CPU':>5} {'MB/s':>8}"]
+        for (stage, ext), (walls, cpus, sizes) in sorted(self._samples.items()):
+            ordered = sorted(walls)
+            p50, p90, p99 = (1000 * percentile(ordered, q) for q in (50, 90, 99))
+            wall = sum(walls)
+            utilization = 100 * sum(cpus) / wall if wall else 0
+            rate = sum(sizes) / 1e6 / wall if wall else 0
+            lines.append(f"{stage:>10} {ext:>6} {len(walls):7d} {p50:8.2f} {p90:8.2f} {p99:8.2f} {utilization:4.0f}% {rate:8.1f}")
+        return "\n".join(lines)
+
+    def dump(self, samples_path):
+        """Writes every raw sample as a CSV row: stage, ext, wall_s, cpu_s, bytes."""
+        with open(samples_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["stage", "ext", "wall_s", "cpu_s", "bytes"])
+            for (stage, ext), columns in self._samples.items():
+                for wall, cpu, nbytes in zip(*columns):
+                    writer.writerow([stage, ext, f"{wall:.6f}", f"{cpu:.6f}", int(nbytes)])
+
+    def close_trace(self):
+        if self._trace_fd is None:
+            return
+        # The closing metadata event makes the array valid JSON (trace viewers also accept it truncated)
+        last = {"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": "photo hashing"}}
+        os.write(self._trace_fd, (json.dumps(last) + "]\n").encode())
+        os.close(self._trace_fd)
+        self._trace_fd = None
+        progress.on_stage_end = None
+        print(f"📄 Trace written to {self.trace_path} (open it in ui.perfetto.dev)")
+
+    def report(self):
+        self.close_trace()
+        if not self._samples:
+            return
+        print("\n📊 Per-stage timings")
+        print(self.summary())
+        if self.samples_path:
+            self.dump(self.samples_path)
+            print(f"📄 Raw samples written to {self.samples_path}")
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+instrument = Instrumentation()
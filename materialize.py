@@ -0,0 +1,114 @@
+import os
+import sys
+import shutil
+import threading
+import contextlib
+from collections import Counter
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# ioctl(dest_fd, FICLONE, src_fd): share extents copy-on-write on btrfs/xfs/bcachefs
+FICLONE = 0x40049409
+
+def hardlink(src, dest):
+    os.link(src, dest)
+
+def reflink(src, dest):
+    if fcntl is None or not sys.platform.startswith("linux"):
+        raise OSError("FICLONE is only available on Linux")
+    with open(src, "rb") as s, open(dest, "wb") as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+    shutil.copystat(src, dest)
+
+def copy_file_range(src, dest):
+    """In-kernel copy: no data passes through user space (and NFS/SMB can offload it server-side)."""
+    if not hasattr(os, "copy_file_range"):
+        raise OSError("os.copy_file_range is not available")
+    with open(src, "rb") as s, open(dest, "wb") as d:
+        remaining = os.fstat(s.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(s.fileno(), d.fileno(), remaining)
+            if copied == 0:
+                break
+            remaining -= copied
+    if remaining > 0:
+        # Some filesystems return 0 for unsupported cases; fail so the next strategy runs
+        raise OSError(f"copy_file_range stopped with {remaining} bytes left")
+    shutil.copystat(src, dest)
+
+def copy(src, dest):
+    shutil.copy2(src, dest)
+
+def replace_file(write, src, dest):
+    """Runs `write(src, dest)` in place of whatever is at `dest`.
+
+    Copy threads can target the same name (two different photos called
+    IMG_0001.jpg going into one union folder), so the file is written under a
+    name private to this thread and renamed over `dest` in one step. Nothing is
+    ever removed or truncated at `dest`, so a concurrent writer never finds it
+    missing, and an old hardlink at `dest` doesn't get overwritten in place.
+    """
+    tmp = f"{dest}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(tmp)  # Left over from an interrupted run
+    try:
+        write(src, tmp)
+        os.replace(tmp, dest)
+    finally:
+        # Also covers rename() being a no-op when `dest` is already a hardlink to `tmp`'s inode
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp)
+
+STRATEGIES = {"hardlink": hardlink, "reflink": reflink, "copy_file_range": copy_file_range, "copy": copy}
+
+class Materializer:
+    """Writes a file to its destination using the fastest strategy that works.
+
+    With `strategy="auto"` reflink, copy_file_range and a plain copy are tried
+    in order and the first that succeeds is remembered per (source device,
+    destination device) pair. Every one of those gives the output its own
+    data; a hardlink shares the inode with the source photo, so it is only
+    used when asked for by name.
+    """
+
+    def __init__(self, strategy="copy"):
+        if strategy != "auto" and strategy not in STRATEGIES:
+            raise ValueError(f"Unknown copy strategy {strategy!r}; expected 'auto' or one of {sorted(STRATEGIES)}")
+        self.strategy = strategy
+        self.used = Counter()
+        self._chosen = {}
+        self._lock = threading.Lock()
+
+    def _candidates(self, src, dest):
+        if self.strategy != "auto":
+            return None, [self.strategy]
+        devices = (os.stat(src).st_dev, os.stat(os.path.dirname(dest) or ".").st_dev)
+        chosen = self._chosen.get(devices)
+        order = [name for name in STRATEGIES if name != "hardlink"]
+        if chosen:
+            order.remove(chosen)
+            order.insert(0, chosen)
+        return devices, order
+
+    def __call__(self, src, dest):
+        """Materializes `src` at `dest`, replacing any existing file. Returns the strategy used."""
+        devices, order = self._candidates(src, dest)
+        for name in order:
+            try:
+                replace_file(STRATEGIES[name], src, dest)
+            except OSError:
+                if name == order[-1]:
+                    raise
+                continue
+            with self._lock:
+                if devices:
+                    self._chosen[devices] = name
+                self.used[name] += 1
+            return name
+
+    def summary(self):
+        used = ", ".join(f"{count} {name}" for name, count in self.used.most_common())
+        return f"🔗 Output written via: {used or 'nothing'}"
@@ -0,0 +1,193 @@
+import os
+import csv
+from collections import Counter
+from concurrency import AdaptiveConcurrency
+from materialize import Materializer
+from prefilter import SizePrefilter, singleton_key
+from perceptual import merge_near_duplicates
+from progress import progress, file_size
+from backends import thread_map, SourceTags
+from hash_cache import SourceCaches, open_cache
+from compact_index import PathIndex
+from instrument import instrument
+from two_folders import clean_up_videos, list_images, select_images, hash_files, copy_image
+
+# Backup sources to reconcile (phones, NAS exports, old drives, ...)
+SOURCES = ["./A", "./B"]
+
+# Optimized thread count: Uses min(32, CPU cores * 2)
+MAX_THREADS = min(32, os.cpu_count() * 2)
+
+# Tune how many hashing and copying tasks are in flight at runtime from throughput, free
+# memory and I/O wait, starting at MAX_THREADS (threads backend; process pools stay fixed)
+ADAPTIVE_CONCURRENCY = False
+ADAPTIVE_MAX_THREADS = 128
+hash_workers = AdaptiveConcurrency(MAX_THREADS, ADAPTIVE_MAX_THREADS, name="hash workers")
+copy_workers = AdaptiveConcurrency(MAX_THREADS, ADAPTIVE_MAX_THREADS, name="copy workers")
+
+# Reuse hashes of unchanged files across runs (stored in each source folder)
+USE_HASH_CACHE = True
+
+# Only decode images whose dimensions are shared by at least one other image
+PREFILTER_BY_SIZE = False
+
+# Hashing backend: "threads", "processes" or "pipeline" (see two_folders.py)
+HASH_BACKEND = "threads"
+MAX_PROCESSES = os.cpu_count()
+PIPELINE_IO_THREADS = 16  # Reads in flight in "pipeline" mode (raise for NAS/NFS)
+
+# "pixel" decodes every image; "bitstream" hashes coded image data straight from the container
+HASH_MODE = "pixel"
+
+# Skip pixel hashing for byte-identical copies (size → first 64KB → full file)
+BYTE_IDENTITY_TIERS = False
+
+# Treat images whose 64-bit dHash differs by at most this many bits as duplicates
+# (None = exact matches only); engine is "mih", "bktree" or "numpy"
+NEAR_DUP_RADIUS = None
+NEAR_DUP_ENGINE = "mih"
+
+# Hide progress bars; per-file details go to an optional NDJSON event log (e.g. "events.ndjson")
+QUIET = False
+EVENT_LOG = None
+
+# Per-file stage timings printed at exit, optional raw samples CSV and Chrome trace JSON
+INSTRUMENT = False
+INSTRUMENT_SAMPLES = None
+INSTRUMENT_TRACE = None
+
+# How output files are written: "copy" (default), "auto" (reflink → copy_file_range → copy)
+# or "hardlink" (opt-in; outputs share the source photo's inode)
+COPY_STRATEGY = "copy"
+
+_materializers = {}
+
+def materializer():
+    """The Materializer for the current COPY_STRATEGY (read at call time, like the other flags)."""
+    writer = _materializers.get(COPY_STRATEGY)
+    if writer is None:
+        writer = _materializers.setdefault(COPY_STRATEGY, Materializer(COPY_STRATEGY))
+    return writer
+
+def source_names(folders):
+    """Short, unique display names for each source folder."""
+    names = []
+    for folder in folders:
+        name = os.path.basename(os.path.normpath(folder)) or folder
+        names.append(name if name not in names else f"{name}_{len(names)}")
+    return names
+
+def index_sources(folders):
+    """Hashes every source once, in one shared pool, into `{hash: source bitmask}` and `{hash: path}`.
+
+    Bit `i` of a mask is set when the image exists in `folders[i]`; the path is
+    taken from the first source that has the image. Paths from all
+    sources are chained and tagged with their source index, so the HASH_BACKEND
+    pool is sized for the whole job rather than once per folder.
+    """
+    prefilter = None
+    if PREFILTER_BY_SIZE:
+        prefilter = SizePrefilter(MAX_THREADS)
+        prefilter.scan([path for folder in folders for path in list_images(folder)])
+
+    resolved, pending = [], []
+    for i, folder in enumerate(folders):
+        files, singletons = select_images(folder, prefilter, BYTE_IDENTITY_TIERS, MAX_THREADS)
+        resolved.extend((i, path, singleton_key(path)) for path in singletons)
+        pending.append((i, files))
+    to_hash = sum(len(files) for _, files in pending) if all(isinstance(files, list) for _, files in pending) else None
+
+    tags = SourceTags((i, path) for i, files in pending for path in files)
+    cache = SourceCaches([open_cache(folder, HASH_MODE) if USE_HASH_CACHE else None for folder in folders], tags.source)
+    digests = hash_files(
+        tags, cache, backend=HASH_BACKEND, mode=HASH_MODE, threads=MAX_THREADS, processes=MAX_PROCESSES,
+        io_threads=PIPELINE_IO_THREADS, controller=hash_workers if ADAPTIVE_CONCURRENCY else None,
+    )
+    hashed = []
+    with progress.stage("hash", folder=",".join(folders)):
+        for i, file_path, img_hash in progress.bar(tags.tag(digests), desc=f"🔍 Hashing {len(folders)} sources", total=to_hash):
+            if img_hash:
+                hashed.append((i, file_path, img_hash))
+            if progress.events:
+                progress.event("hashed", path=file_path, hash=img_hash, bytes=file_size(file_path))
+    cache.close()
+    if ADAPTIVE_CONCURRENCY and HASH_BACKEND == "threads":
+        print(hash_workers.summary())
+
+    results = resolved + hashed
+    if NEAR_DUP_RADIUS is not None:
+        print(f"\n🔍 Matching near-duplicates (radius {NEAR_DUP_RADIUS} bits)...")
+        indexes = [PathIndex() for _ in folders]
+        for i, path, h in results:
+            indexes[i][h] = path
+        indexes = merge_near_duplicates(indexes, NEAR_DUP_RADIUS, MAX_THREADS, NEAR_DUP_ENGINE)
+        results = [(i, path, h) for i, index in enumerate(indexes) for h, path in index.items()]
+
+    membership, paths = {}, {}
+    for i, path, h in results:
+        mask = membership.get(h, 0)
+        first = mask & -mask  # Bit of the first source seen with this image so far
+        # Results arrive in completion order, so keep the earliest source's path
+        if not mask or 1 << i < first or (1 << i == first and path < paths[h]):
+            paths[h] = path
+        membership[h] = mask | 1 << i
+    return membership, paths
+
+def write_membership_report(membership, paths, names, report_path):
+    """Writes one CSV row per distinct image: hash, number of sources, source names, path."""
+    with open(report_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["hash", "sources", "source_names", "path"])
+        for h, mask in membership.items():
+            present = [name for i, name in enumerate(names) if mask >> i & 1]
+            writer.writerow([h, len(present), ";".join(present), paths[h]])
+
+def compare_sources_and_sort(folders, output_folder):
+    """Finds per-source unique images, the full intersection and the union of N folders."""
+    names = source_names(folders)
+    print(f"\n🔍 Hashing {len(folders)} sources...")
+    membership, paths = index_sources(folders)
+
+    full_mask = (1 << len(folders)) - 1
+    sets = {os.path.join(output_folder, f"only_{name}"): [h for h, mask in membership.items() if mask == 1 << i] for i, name in enumerate(names)}
+    sets[os.path.join(output_folder, "all_sources")] = [h for h, mask in membership.items() if mask == full_mask]
+    sets[os.path.join(output_folder, "union")] = list(membership)
+
+    for target_folder, hashes in sets.items():
+        os.makedirs(target_folder, exist_ok=True)
+        with progress.stage("copy", folder=target_folder):
+            copies = thread_map(lambda item: copy_image(paths[item[1]], target_folder, item[0], len(hashes), materializer()), enumerate(hashes), MAX_THREADS, copy_workers if ADAPTIVE_CONCURRENCY else None)
+            for _ in progress.bar(copies, desc=f"📁 Copying to {target_folder}", total=len(hashes)):
+                pass
+
+    report_path = os.path.join(output_folder, "membership.csv")
+    write_membership_report(membership, paths, names, report_path)
+
+    counts = Counter(bin(mask).count("1") for mask in membership.values())
+    print("\n✅ Sorting complete! Images have been copied.")
+    for k in range(1, len(folders) + 1):
+        print(f"📂 In exactly {k} of {len(folders)} sources: {counts[k]}")
+    for name, target_folder in zip(names, sets):
+        print(f"📂 Only in {name}: {len(sets[target_folder])}")
+    print(f"📄 Per-image membership written to {report_path}")
+    print(materializer().summary())
+    if ADAPTIVE_CONCURRENCY:
+        print(copy_workers.summary())
+
+if __name__ == "__main__":
+    output_folder = "output_n"
+    missing = [folder for folder in SOURCES if not os.path.exists(folder)]
+
+    if not missing:
+        progress.configure(QUIET, EVENT_LOG)
+        instrument.configure(INSTRUMENT, INSTRUMENT_SAMPLES, INSTRUMENT_TRACE)
+
+        print("\n🔍 Step 1: Cleaning up videos (MP4 & MOV files)...")
+        for folder in SOURCES:
+            clean_up_videos(folder, os.path.join(output_folder, "videos"))
+
+        print("\n🔍 Step 2: Comparing and categorizing images...")
+        compare_sources_and_sort(SOURCES, output_folder)
+        progress.close()
+    else:
+        print(f"Error: Missing source folders: {', '.join(missing)}")
@@ -1,10 +1,22 @@
+import io
 import os
-import hashlib
 import shutil
-import concurrent.futures
 from PIL import Image
 from pillow_heif import register_heif_opener
-from tqdm import tqdm
+from hash_cache import open_cache
+from prefilter import SizePrefilter, singleton_key
+from backends import InputOrder, thread_map, hash_in_threads, hash_in_processes
+from pipeline import hash_in_pipeline, WriterStage, FirstSeenIndex
+from concurrency import AdaptiveConcurrency
+from pixel_hash import rgb_digest, timed_rgb_digest
+from bitstream import bitstream_digest, file_bitstream_digest
+from file_tiers import ByteIdentityTiers
+from perceptual import merge_near_duplicates
+from progress import progress, file_size
+from instrument import instrument, Laps, NOT_TIMED
+from materialize import Materializer
+from external_sort import SpillSorter
+from compact_index import PathIndex, CompactIndexBuilder
 
 # Register HEIF support
 register_heif_opener()
@@ -12,6 +24,76 @@ register_heif_opener()
 # Optimized thread count
 MAX_THREADS = min(32, os.cpu_count() * 2)
 
+# Tune how many hashing and copying tasks are in flight at runtime from throughput, free
+# memory and I/O wait, starting at MAX_THREADS (threads backend; process pools stay fixed)
+ADAPTIVE_CONCURRENCY = False
+ADAPTIVE_MAX_THREADS = 128
+hash_workers = AdaptiveConcurrency(MAX_THREADS, ADAPTIVE_MAX_THREADS, name="hash workers")
+copy_workers = AdaptiveConcurrency(MAX_THREADS, ADAPTIVE_MAX_THREADS, name="copy workers")
+
+# Reuse hashes of unchanged files across runs (stored in the scanned folder)
+USE_HASH_CACHE = True
+
+# Only decode images whose dimensions are shared by at least one other image
+PREFILTER_BY_SIZE = False
+
+# Hashing backend: "threads", "processes" (sidesteps the GIL for decode-heavy HEIC sets) or
+# "pipeline" (I/O threads read files ahead while processes decode & hash the bytes)
+HASH_BACKEND = "threads"
+MAX_PROCESSES = os.cpu_count()
+PIPELINE_IO_THREADS = 16  # Reads in flight in "pipeline" mode (raise for NAS/NFS)
+
+# Rows per strip when hashing pixels (keeps peak memory low; 0 = whole image at once)
+HASH_STRIP_ROWS = 256
+
+# "pixel" decodes every image; "bitstream" hashes coded image data straight from the
+# container (JPEG, PNG, HEIC) and falls back to pixels otherwise. Hashes from the two modes
+# are not comparable, and bitstream mode only matches identically-encoded images.
+HASH_MODE = "pixel"
+
+# Skip pixel hashing for byte-identical copies (size → first 64KB → full file)
+BYTE_IDENTITY_TIERS = False
+
+# Treat images whose 64-bit dHash differs by at most this many bits as duplicates
+# (catches recompressed/resized copies). None = exact matches only.
+NEAR_DUP_RADIUS = None
+# "mih" (pure Python multi-index hash tables: ~5s for 100k and ~5 min for 1M images at
+# radius 6; larger radii cost more), "bktree" (pure Python, slower at scale) or "numpy"
+# (vectorized XOR + popcount, needs NumPy; all-pairs, best for small sets at large radii)
+NEAR_DUP_ENGINE = "mih"
+
+# Copy each unique image as soon as its hash is first seen, overlapping hashing and copying.
+# Hash results are released in scan order, so the first file of a duplicate group always
+# wins (exact matching only; near-duplicate mode copies after hashing)
+STREAM_COPIES = False
+STREAM_COPY_THREADS = 8
+
+# Keep the hash → file index as packed binary digests with compressed paths (~4x smaller)
+COMPACT_INDEX = False
+
+# Spill hashes to sorted run files and k-way merge them instead of keeping the index
+# in memory (for corpora larger than RAM; exact matching and plain copies only)
+SPILL_TO_DISK = False
+SPILL_RUN_RECORDS = 1_000_000
+SPILL_DIR = None  # Temp directory for run files (None = system default)
+
+# Hide progress bars; per-file details go to an optional NDJSON event log (e.g. "events.ndjson")
+QUIET = False
+EVENT_LOG = None
+
+# Time open/decode/convert/tobytes/hash/copy per file and print p50/p90/p99 by extension
+# at exit (threads backend; process workers are not sampled). Optional raw samples CSV.
+INSTRUMENT = False
+INSTRUMENT_SAMPLES = None
+# Chrome trace-event JSON with one span per file per stage and per phase, by thread and
+# process (e.g. "trace.json", for ui.perfetto.dev); implies INSTRUMENT
+INSTRUMENT_TRACE = None
+
+# How output files are written: "copy" (default) writes independent copies; "auto" picks the
+# fastest independent copy per device pair (reflink → copy_file_range → copy); "hardlink"
+# (opt-in) makes outputs share the source photo's inode, so editing one edits both.
+COPY_STRATEGY = "copy"
+
 IMAGE_EXTENSIONS = {".heic", ".jpg", ".jpeg", ".png"}
 VIDEO_EXTENSIONS = {".mp4", ".mov"}
 
@@ -22,59 +104,224 @@ def clean_up_videos(folder, video_output_folder):
     os.makedirs(video_output_folder, exist_ok=True)
     files = list(os.scandir(folder))
 
-    for idx, entry in enumerate(tqdm(files, desc=f"🔍 Cleaning {folder}", unit="file")):
-        file_path = entry.path
-        file_base, file_ext = os.path.splitext(entry.name)
-        file_ext = file_ext.lower()
+    with progress.stage("clean_up_videos", folder=folder):
+        for entry in progress.bar(files, desc=f"🔍 Cleaning {folder}"):
+            file_path = entry.path
+            file_base, file_ext = os.path.splitext(entry.name)
+            file_ext = file_ext.lower()
 
-        if file_ext in VIDEO_EXTENSIONS:
-            if file_base in image_files:
-                os.remove(file_path)
-                print(f"[{idx+1}/{len(files)}] 🗑️ Deleted {entry.name} (Matching image exists)")
-            else:
-                shutil.move(file_path, os.path.join(video_output_folder, entry.name))
-                print(f"[{idx+1}/{len(files)}] 📂 Moved {entry.name} → {video_output_folder}")
+            if file_ext in VIDEO_EXTENSIONS:
+                if file_base in image_files:
+                    with instrument.timed("delete", file_path) if instrument.enabled else NOT_TIMED:
+                        os.remove(file_path)
+                    progress.event("video_deleted", path=file_path, reason="Matching image exists")
+                else:
+                    with instrument.timed("move", file_path) if instrument.enabled else NOT_TIMED:
+                        shutil.move(file_path, os.path.join(video_output_folder, entry.name))
+                    progress.event("video_moved", path=file_path, dest=video_output_folder)
 
-def get_image_hash(image_path):
-    """Compute a SHA-256 hash of an image's pixel data (ignoring metadata)."""
+def image_digest(image_path):
+    """Returns the raw SHA-256 digest of an image's pixel data, or None if unreadable."""
+    if instrument.enabled:
+        return timed_image_digest(image_path)
+    if HASH_MODE == "bitstream":
+        try:
+            digest = file_bitstream_digest(image_path)
+        except OSError:
+            return None
+        if digest:
+            return digest
     try:
         with Image.open(image_path) as img:
-            img = img.convert("RGB")
-            return hashlib.sha256(img.tobytes()).hexdigest()
+            return rgb_digest(img, HASH_STRIP_ROWS)
     except Exception:
         return None
 
-def process_images(folder):
-    """Scans & hashes images with multithreading and progress tracking."""
-    image_hashes = {}
-    files = [entry for entry in os.scandir(folder) if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS]
+def buffer_digest(data):
+    """`image_digest` for a file already read into memory (the "pipeline" backend's CPU stage)."""
+    if HASH_MODE == "bitstream":
+        digest = bitstream_digest(data)
+        if digest:
+            return digest
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            return rgb_digest(img, HASH_STRIP_ROWS)
+    except Exception:
+        return None
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_THREADS) as executor:
-        futures = {executor.submit(get_image_hash, entry.path): entry.path for entry in files}
+def timed_image_digest(image_path):
+    """`image_digest` that records a sample for each stage it goes through."""
+    laps = Laps()
+    size = file_size(image_path) or 0
+    try:
+        if HASH_MODE == "bitstream":
+            try:
+                digest = file_bitstream_digest(image_path)
+            except OSError:
+                return None
+            laps.lap("bitstream", size)
+            if digest:
+                return digest
+        with Image.open(image_path) as img:
+            laps.lap("open", size)
+            return timed_rgb_digest(img, HASH_STRIP_ROWS, laps)
+    except Exception:
+        return None
+    finally:
+        instrument.record_laps(image_path, laps)
+
+def get_image_hash(image_path, cache=None):
+    """Compute a SHA-256 hash of an image's pixel data (ignoring metadata)."""
+    try:
+        if cache:
+            cached, st = cache.get(image_path)
+            if cached:
+                return cached
+        digest = image_digest(image_path)
+        if digest is None:
+            return None
+        img_hash = digest.hex()
+        if cache:
+            cache.put(st, img_hash)
+        return img_hash
+    except Exception:
+        return None
 
-        for idx, future in enumerate(tqdm(concurrent.futures.as_completed(futures), desc=f"🔍 Hashing {folder}", total=len(files), unit="file")):
-            file_path = futures[future]
-            img_hash = future.result()
+def iter_images(folder):
+    """Lazily yields the paths of all images directly inside `folder`."""
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                yield entry.path
+
+def list_images(folder):
+    """Returns the paths of all images directly inside `folder`."""
+    return list(iter_images(folder))
+
+def process_images(folder, *, prefilter=None, index=None, ordered=False):
+    """Scans & hashes images with multithreading and progress tracking.
+
+    `prefilter` is a scanned SizePrefilter (one is built when PREFILTER_BY_SIZE
+    is set). Results go into `index` (anything supporting `index[hash] = path`)
+    when given, in sorted path order if `ordered` is set (otherwise in completion order).
+    """
+    if index is not None:
+        image_hashes = index
+    else:
+        image_hashes = CompactIndexBuilder() if COMPACT_INDEX else PathIndex()
+    files = iter_images(folder)
+    total_files = None
+
+    if BYTE_IDENTITY_TIERS or prefilter or PREFILTER_BY_SIZE:
+        # Grouping stages need the whole listing up front
+        files = list(files)
+        total_files = len(files)
+
+    if BYTE_IDENTITY_TIERS:
+        tiers = ByteIdentityTiers(MAX_THREADS)
+        files = tiers.representatives(files)
+        print(tiers.summary())
+
+    if prefilter is None and PREFILTER_BY_SIZE:
+        prefilter = SizePrefilter(MAX_THREADS)
+        prefilter.scan(files)
+    if prefilter:
+        files, singletons = prefilter.split(files)
+        for file_path in singletons:
+            image_hashes[singleton_key(file_path)] = file_path
+        print(f"📐 Size prefilter: {len(singletons)} images have unique dimensions, {len(files)} need hashing")
+
+    cache = open_cache(folder, HASH_MODE) if USE_HASH_CACHE else None
+    if ordered:
+        # Sorted input makes the first result per hash its smallest path, as in PathIndex
+        files = sorted(files)
+    to_hash = len(files) if isinstance(files, list) else None
+    if ordered:
+        files = InputOrder(files)
+
+    if HASH_BACKEND == "processes":
+        results = hash_in_processes(image_digest, files, cache, MAX_PROCESSES)
+    elif HASH_BACKEND == "pipeline":
+        results = hash_in_pipeline(buffer_digest, files, cache, PIPELINE_IO_THREADS, MAX_PROCESSES)
+    else:
+        results = hash_in_threads(get_image_hash, files, cache, MAX_THREADS, hash_workers if ADAPTIVE_CONCURRENCY else None)
+    if ordered:
+        results = files.release(results)
+
+    hashed = 0
+    with progress.stage("hash", folder=folder):
+        for file_path, img_hash in progress.bar(results, desc=f"🔍 Hashing {folder}", total=to_hash):
+            hashed += 1
             if img_hash:
                 image_hashes[img_hash] = file_path
-            print(f"[{idx+1}/{len(files)}] 🖼️ Hashed {os.path.basename(file_path)}")
+            if progress.events:
+                progress.event("hashed", path=file_path, hash=img_hash, bytes=file_size(file_path))
+
+    if cache:
+        cache.close()
+        print(cache.summary())
+    if ADAPTIVE_CONCURRENCY and HASH_BACKEND == "threads":
+        print(hash_workers.summary())
+
+    if isinstance(image_hashes, CompactIndexBuilder):
+        image_hashes = image_hashes.build()
 
-    return image_hashes, len(files)
+    if total_files is None:
+        total_files = hashed
+    return image_hashes, total_files
+
+_materializers = {}
+
+def materializer():
+    """The Materializer for the current COPY_STRATEGY (read at call time, like the other flags)."""
+    writer = _materializers.get(COPY_STRATEGY)
+    if writer is None:
+        writer = _materializers.setdefault(COPY_STRATEGY, Materializer(COPY_STRATEGY))
+    return writer
 
 def copy_image(src, dest_folder, idx, total):
     """Copies an image with progress tracking."""
     os.makedirs(dest_folder, exist_ok=True)
-    shutil.copy2(src, os.path.join(dest_folder, os.path.basename(src)))
-    print(f"[{idx+1}/{total}] ✅ Copied {os.path.basename(src)} → {dest_folder}")
+    with instrument.timed("copy", src) if instrument.enabled else NOT_TIMED:
+        materializer()(src, os.path.join(dest_folder, os.path.basename(src)))
+    if progress.events:
+        progress.event("copied", path=src, dest=dest_folder, index=idx, total=total, bytes=file_size(src))
+
+def remove_duplicates_spilled(folder_c, output_folder):
+    """`remove_duplicates_and_store_unique` with bounded memory: hashes are spilled to
+    sorted run files, and unique images are copied in one streaming pass over the merge."""
+    sorter = SpillSorter(SPILL_RUN_RECORDS, SPILL_DIR)
+    try:
+        _, total_files_before = process_images(folder_c, index=sorter.writer(0))
+
+        unique_folder = os.path.join(output_folder, "Unique")
+        for folder in (unique_folder, os.path.join(output_folder, "videos")):
+            os.makedirs(folder, exist_ok=True)
+
+        # Records are merged in (digest, source, path) order, so the smallest path of a group wins (as in PathIndex)
+        first_paths = enumerate(members[0][1] for _, members in sorter.groups())
+        total_files_after = 0
+        with progress.stage("copy", folder=unique_folder):
+            copies = thread_map(lambda item: copy_image(item[1], unique_folder, item[0], None), first_paths, MAX_THREADS, copy_workers if ADAPTIVE_CONCURRENCY else None)
+            for _ in progress.bar(copies, desc=f"📁 Copying to {unique_folder}"):
+                total_files_after += 1
+    finally:
+        sorter.close()
+
+    print("\n✅ Duplicate removal complete!")
+    print(materializer().summary())
+    if ADAPTIVE_CONCURRENCY:
+        print(copy_workers.summary())
+    print(f"📂 Total files before processing: {total_files_before}")
+    print(f"📂 Total unique files after processing: {total_files_after}")
+    print(f"❌ Total duplicate files removed: {total_files_before - total_files_after}")
 
 def remove_duplicates_and_store_unique(folder_c, output_folder):
     """Find duplicates within a single folder and store only unique images in `output2/`."""
     print("\n🔍 Step 2: Detecting duplicates and storing unique images...")
+    if SPILL_TO_DISK:
+        return remove_duplicates_spilled(folder_c, output_folder)
     
-    images_c, total_files_before = process_images(folder_c)
-    unique_files = len(images_c)
-    duplicate_files = total_files_before - unique_files  # Duplicates found
-
     folders = {
         "Unique": os.path.join(output_folder, "Unique"),
         "Videos": os.path.join(output_folder, "videos"),
@@ -83,17 +330,36 @@ def remove_duplicates_and_store_unique(folder_c, output_folder):
     for folder in folders.values():
         os.makedirs(folder, exist_ok=True)
 
-    files_to_copy = list(images_c.values())
-    total_files_after = len(files_to_copy)
+    if STREAM_COPIES and NEAR_DUP_RADIUS is None:
+        # Hash results flow straight into the copy threads, so wall time is about max(hash, copy)
+        writer = WriterStage(lambda file_path, idx: copy_image(file_path, folders["Unique"], idx, None), STREAM_COPY_THREADS)
+        try:
+            images_c, total_files_before = process_images(folder_c, index=FirstSeenIndex(writer.submit), ordered=True)
+        finally:
+            writer.close()
+        total_files_after = len(images_c)
+        duplicate_files = total_files_before - total_files_after
+    else:
+        images_c, total_files_before = process_images(folder_c)
+        if NEAR_DUP_RADIUS is not None:
+            print(f"\n🔍 Grouping near-duplicates (radius {NEAR_DUP_RADIUS} bits)...")
+            images_c, = merge_near_duplicates([images_c], NEAR_DUP_RADIUS, MAX_THREADS, NEAR_DUP_ENGINE)
+        unique_files = len(images_c)
+        duplicate_files = total_files_before - unique_files  # Duplicates found
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_THREADS) as executor:
-        futures = {executor.submit(copy_image, file_path, folders["Unique"], idx, total_files_after) for idx, file_path in enumerate(files_to_copy)}
+        files_to_copy = list(images_c.values())
+        total_files_after = len(files_to_copy)
 
-        for future in concurrent.futures.as_completed(futures):
-            future.result()  # Wait for all tasks to complete
+        with progress.stage("copy", folder=folders["Unique"]):
+            copies = thread_map(lambda item: copy_image(item[1], folders["Unique"], item[0], total_files_after), enumerate(files_to_copy), MAX_THREADS, copy_workers if ADAPTIVE_CONCURRENCY else None)
+            for _ in progress.bar(copies, desc=f"📁 Copying to {folders['Unique']}", total=total_files_after):
+                pass  # Wait for all tasks to complete
 
     # Print summary
     print("\n✅ Duplicate removal complete!")
+    print(materializer().summary())
+    if ADAPTIVE_CONCURRENCY:
+        print(copy_workers.summary())
     print(f"📂 Total files before processing: {total_files_before}")
     print(f"📂 Total unique files after processing: {total_files_after}")
     print(f"❌ Total duplicate files removed: {duplicate_files}")
@@ -103,9 +369,13 @@ if __name__ == "__main__":
     output_folder = "output2"
 
     if os.path.exists(folder_c):
+        progress.configure(QUIET, EVENT_LOG)
+        instrument.configure(INSTRUMENT, INSTRUMENT_SAMPLES, INSTRUMENT_TRACE)
+
         print("\n🔍 Step 1: Cleaning up videos (MP4 & MOV files)...")
         clean_up_videos(folder_c, os.path.join(output_folder, "videos"))
 
         remove_duplicates_and_store_unique(folder_c, output_folder)
+        progress.close()
     else:
         print("Error: Folder `C` does not exist.")
@@ -0,0 +1,200 @@
+import math
+import itertools
+import concurrent.futures
+from PIL import Image
+from hamming import HammingIndex
+from compact_index import PathIndex
+
+try:
+    from pillow_heif import thumbnail as heif_thumbnail
+except ImportError:  # pillow_heif >= 1.0 selects thumbnails through draft() instead
+    heif_thumbnail = None
+
+# Smallest decode the perceptual hash is derived from
+MIN_DECODE_SIZE = 32
+
+def reduced_decode(img, min_size=MIN_DECODE_SIZE):
+    """Returns the cheapest version of `img` that is still at least `min_size` pixels per side.
+
+    JPEGs use DCT scaling via `draft()` (down to 1/8 resolution, decoded straight
+    to grayscale); HEIC images use their smallest embedded thumbnail that is large
+    enough. Anything else is returned unchanged and decoded in full.
+
+    HEVC has no reduced-resolution decode (libheif always decodes every tile at
+    full size), so a HEIC without a thumbnail (e.g. exported by some editors)
+    falls back to a full decode; cameras and phones embed one.
+    """
+    if img.draft("L", (min_size, min_size)) is None and img.format == "HEIF" and heif_thumbnail:
+        return heif_thumbnail(img, min_box=min_size)
+    return img
+
+def dhash(image_path, reduced=True):
+    """64-bit difference hash: compares horizontally adjacent pixels of a 9x8 grayscale thumbnail."""
+    try:
+        with Image.open(image_path) as img:
+            source = reduced_decode(img) if reduced else img
+            small = source.convert("L").resize((9, 8), Image.Resampling.LANCZOS)
+    except Exception:
+        return None
+
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            bits = (bits << 1) | (left > pixels[row * 9 + col + 1])
+    return bits
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes for radius queries in Hamming space."""
+
+    def __init__(self):
+        self.root = None  # Node: [hash, [items], {distance: child}]
+
+    def add(self, value, item):
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value, radius):
+        """Returns the items of every stored hash within `radius` bits of `value`."""
+        if self.root is None:
+            return []
+        found, stack = [], [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                found.extend(node[1])
+            for child_distance, child in node[2].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return found
+
+class MultiIndexHash:
+    """Multi-index hash tables over 64-bit hashes for radius queries in Hamming space.
+
+    The bits are split into `m` blocks of about log2(n) bits, so each block
+    table holds about one entry per bucket. Two hashes within `radius` bits have
+    at least one block within `radius // m` bits of each other (pigeonhole), so
+    a query probes every bucket within that sub-radius of its own block value
+    and verifies the full distance only for the entries found there.
+    """
+
+    def __init__(self, radius, expected=1 << 16, bits=64):
+        count = max(1, min(bits, round(bits / math.log2(max(expected, 4)))))
+        bounds = [bits * k // count for k in range(count + 1)]
+        sub_radius = radius // count
+        self.radius = radius
+        self._blocks = []  # (shift, mask, XOR masks of every bucket within the sub-radius)
+        for low, high in zip(bounds, bounds[1:]):
+            width = high - low
+            flips = [sum(1 << bit for bit in combo) for k in range(min(sub_radius, width) + 1)
+                     for combo in itertools.combinations(range(width), k)]
+            self._blocks.append((low, (1 << width) - 1, flips))
+        self._tables = [{} for _ in self._blocks]  # block value -> [hash]
+        self._items = {}                            # hash -> [items]
+
+    def add(self, value, item):
+        items = self._items.get(value)
+        if items is not None:
+            items.append(item)
+            return
+        self._items[value] = [item]
+        for (shift, mask, _), table in zip(self._blocks, self._tables):
+            table.setdefault(value >> shift & mask, []).append(value)
+
+    def search(self, value):
+        """Returns the items of every stored hash within `radius` bits of `value`."""
+        radius, matches = self.radius, set()
+        for (shift, mask, flips), table in zip(self._blocks, self._tables):
+            key, get = value >> shift & mask, table.get
+            for flip in flips:
+                bucket = get(key ^ flip)
+                if bucket:
+                    for stored in bucket:
+                        if (value ^ stored).bit_count() <= radius:
+                            matches.add(stored)
+        return [item for stored in matches for item in self._items[stored]]
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+def _union(parent, i, j):
+    root_i, root_j = _find(parent, i), _find(parent, j)
+    if root_i != root_j:
+        parent[root_i] = root_j
+
+def near_duplicate_groups(hashes, radius):
+    """Groups positions of `hashes` (ints or None) connected by Hamming distance <= radius."""
+    parent = list(range(len(hashes)))
+    index = MultiIndexHash(radius, sum(value is not None for value in hashes))
+    for i, value in enumerate(hashes):
+        if value is None:
+            continue
+        for j in index.search(value):
+            _union(parent, i, j)
+        index.add(value, i)
+    return [_find(parent, i) for i in range(len(hashes))]
+
+def bktree_near_duplicate_groups(hashes, radius):
+    """Same as `near_duplicate_groups`, searching a BK-tree instead of multi-index tables."""
+    parent = list(range(len(hashes)))
+    tree = BKTree()
+    for i, value in enumerate(hashes):
+        if value is None:
+            continue
+        for j in tree.search(value, radius):
+            _union(parent, i, j)
+        tree.add(value, i)
+    return [_find(parent, i) for i in range(len(hashes))]
+
+def numpy_near_duplicate_groups(hashes, radius):
+    """Same as `near_duplicate_groups`, using vectorized XOR + popcount over a uint64 array."""
+    parent = list(range(len(hashes)))
+    positions = [i for i, value in enumerate(hashes) if value is not None]
+    index = HammingIndex([hashes[i] for i in positions])
+    for a, b in index.pairs_within(radius):
+        _union(parent, positions[a], positions[b])
+    return [_find(parent, i) for i in range(len(hashes))]
+
+GROUPING_ENGINES = {"mih": near_duplicate_groups, "bktree": bktree_near_duplicate_groups, "numpy": numpy_near_duplicate_groups}
+
+def merge_near_duplicates(indexes, radius, max_workers, engine="mih"):
+    """Re-keys `{hash: path}` dicts so near-duplicate images share one key.
+
+    Every group of images within `radius` bits of each other (transitively,
+    across all `indexes`) takes the smallest exact hash in the group as its
+    key. Within one index the group keeps its smallest path, the same rule as
+    for exact duplicates (see `PathIndex`).
+    """
+    entries = [(i, key, path) for i, index in enumerate(indexes) for key, path in index.items()]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        hashes = list(executor.map(dhash, [path for _, _, path in entries]))
+
+    roots = GROUPING_ENGINES[engine](hashes, radius)
+    canonical = {}
+    for (_, key, _), root in zip(entries, roots):
+        canonical[root] = min(canonical.get(root, key), key)
+
+    merged = [PathIndex() for _ in indexes]
+    for (i, _, path), root in zip(entries, roots):
+        merged[i][canonical[root]] = path
+    return merged
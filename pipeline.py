@@ -0,0 +1,151 @@
+import os
+import queue
+import threading
+import collections
+import concurrent.futures
+from backends import IN_FLIGHT_PER_WORKER
+
+# Bytes read ahead but not yet hashed; reads pause while this much is waiting (backpressure)
+MAX_BUFFERED_BYTES = 512 * 1024 * 1024
+
+def read_file(path):
+    """Reads a whole file, asking the kernel to read all of it ahead in one go.
+
+    WILLNEED queues the entire file instead of growing the readahead window a
+    chunk at a time, which keeps an HDD streaming while other reads are queued.
+    """
+    with open(path, "rb", buffering=0) as f:
+        if hasattr(os, "posix_fadvise"):
+            try:
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            except OSError:
+                pass
+        return f.read()
+
+def _read_or_none(path):
+    try:
+        return read_file(path)
+    except OSError:
+        return None
+
+def hash_in_pipeline(digest_fn, files, cache, io_workers, cpu_workers):
+    """Yields `(path, hash)` pairs from a read stage feeding a hashing stage.
+
+    A thread pool of `io_workers` only reads files into memory; a process pool
+    of `cpu_workers` runs `digest_fn(data)` on the bytes. Each stage has its
+    own bounded window, and files that have been read wait in a queue capped
+    by count and by MAX_BUFFERED_BYTES, so a slow stage stalls the one before
+    it instead of piling up memory. Cache lookups and writes stay in the parent.
+    """
+    read_window = io_workers * IN_FLIGHT_PER_WORKER
+    cpu_window = cpu_workers * IN_FLIGHT_PER_WORKER
+    files = iter(files)
+    reads, digests = {}, {}
+    ready = collections.deque()  # (path, st, data) read and waiting for a CPU slot
+    buffered = 0
+    exhausted = False
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=io_workers) as io_pool, \
+            concurrent.futures.ProcessPoolExecutor(max_workers=cpu_workers) as cpu_pool:
+        while True:
+            # Read stage: keep the disk busy unless hashing has fallen behind
+            while not exhausted and len(reads) < read_window and len(ready) < cpu_window and buffered < MAX_BUFFERED_BYTES:
+                file_path = next(files, None)
+                if file_path is None:
+                    exhausted = True
+                    break
+                st = None
+                if cache:
+                    try:
+                        cached, st = cache.get(file_path)
+                    except OSError:
+                        yield file_path, None
+                        continue
+                    if cached:
+                        yield file_path, cached
+                        continue
+                reads[io_pool.submit(_read_or_none, file_path)] = (file_path, st)
+
+            # Hash stage: hand buffered files to the process pool
+            while ready and len(digests) < cpu_window:
+                file_path, st, data = ready.popleft()
+                buffered -= len(data)
+                digests[cpu_pool.submit(digest_fn, data)] = (file_path, st)
+
+            if not reads and not digests:
+                if exhausted and not ready:
+                    break
+                continue
+
+            done, _ = concurrent.futures.wait(list(reads) + list(digests), return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future in reads:
+                    file_path, st = reads.pop(future)
+                    data = future.result()
+                    if data is None:
+                        yield file_path, None
+                    else:
+                        ready.append((file_path, st, data))
+                        buffered += len(data)
+                else:
+                    file_path, st = digests.pop(future)
+                    digest = future.result()
+                    img_hash = digest.hex() if digest else None
+                    if img_hash and cache:
+                        cache.put(st, img_hash)
+                    yield file_path, img_hash
+
+class WriterStage:
+    """Runs `fn(*args)` on `workers` threads fed through a queue of `capacity` items.
+
+    `submit()` blocks while the queue is full, so a producer (e.g. a loop over
+    hashing results) slows down to the speed of the writes instead of queuing
+    unbounded work. `close()` waits for everything submitted and re-raises the
+    first error.
+    """
+
+    def __init__(self, fn, workers, capacity=None):
+        self.fn = fn
+        self.count = 0
+        self._queue = queue.Queue(capacity or workers * IN_FLIGHT_PER_WORKER)
+        self._error = None
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self):
+        while (args := self._queue.get()) is not None:
+            try:
+                self.fn(*args)
+            except Exception as e:
+                self._error = self._error or e
+
+    def submit(self, *args):
+        self._queue.put(args)
+        self.count += 1
+
+    def close(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        if self._error:
+            raise self._error
+
+class FirstSeenIndex(dict):
+    """`{hash: path}` sink for `process_images` that keeps the first path per hash
+    and calls `on_new(path, n)` for the n-th new hash as it arrives.
+
+    With `ordered=True` files arrive in sorted order, so the first path is also
+    the smallest one, the same winner as `PathIndex`.
+    """
+
+    def __init__(self, on_new):
+        super().__init__()
+        self.on_new = on_new
+
+    def __setitem__(self, key, path):
+        if key not in self:
+            super().__setitem__(key, path)
+            self.on_new(path, len(self) - 1)
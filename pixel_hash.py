@@ -0,0 +1,43 @@
+import hashlib
+
+def rgb_digest(img, strip_rows=256):
+    """SHA-256 of `img.convert("RGB").tobytes()`, fed one strip of rows at a time.
+
+    Raw RGB rows are packed back to back, so hashing strips in order gives the
+    same digest as hashing the whole buffer, without holding a full RGB copy
+    and its bytes object in memory. `strip_rows <= 0` hashes in one go.
+    """
+    sha = hashlib.sha256()
+    if strip_rows <= 0:
+        sha.update(img.convert("RGB").tobytes())
+        return sha.digest()
+
+    img.load()
+    width, height = img.size
+    for top in range(0, height, strip_rows):
+        strip = img.crop((0, top, width, min(top + strip_rows, height)))
+        if strip.mode != "RGB":
+            strip = strip.convert("RGB")
+        sha.update(strip.tobytes())
+    return sha.digest()
+
+def timed_rgb_digest(img, strip_rows, laps):
+    """`rgb_digest` with decode, convert (crop + RGB conversion), tobytes and hash
+    time charged to `laps` (an `instrument.Laps`), counting decoded bytes. Gives the same digest.
+
+    The interleaved per-strip stages share one "pixels" timeline span."""
+    sha = hashlib.sha256()
+    img.load()
+    width, height = img.size
+    laps.lap("decode", width * height * len(img.getbands()))
+    step = strip_rows if strip_rows > 0 else height
+    for top in range(0, height, step):
+        strip = img.crop((0, top, width, min(top + step, height))) if strip_rows > 0 else img
+        if strip.mode != "RGB":
+            strip = strip.convert("RGB")
+        laps.lap("convert", strip.width * strip.height * 3, span="pixels")
+        data = strip.tobytes()
+        laps.lap("tobytes", len(data), span="pixels")
+        sha.update(data)
+        laps.lap("hash", len(data), span="pixels")
+    return sha.digest()
@@ -0,0 +1,46 @@
+import os
+import hashlib
+import concurrent.futures
+from collections import Counter
+from PIL import Image
+
+def read_dimensions(image_path):
+    """Reads an image's (width, height) from its header without decoding pixels."""
+    try:
+        with Image.open(image_path) as img:
+            return img.size
+    except Exception:
+        return None
+
+def singleton_key(image_path):
+    """Stand-in key for an image that cannot have a pixel-identical twin."""
+    return hashlib.sha256(b"unique-size\0" + os.path.abspath(image_path).encode()).hexdigest()
+
+class SizePrefilter:
+    """Groups images by dimensions so only images sharing a size get fully decoded.
+
+    Grouping is by (width, height) only: the pixel hash ignores the container
+    format, so a PNG and a JPEG of the same size may still be identical.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self.dimensions = {}
+        self.counts = Counter()
+
+    def scan(self, paths):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for path, size in zip(paths, executor.map(read_dimensions, paths)):
+                self.dimensions[path] = size
+                if size:
+                    self.counts[size] += 1
+
+    def split(self, paths):
+        """Returns `(candidates, singletons)`; unreadable images are left out of both."""
+        candidates, singletons = [], []
+        for path in paths:
+            size = self.dimensions.get(path)
+            if size is None:
+                continue
+            (candidates if self.counts[size] > 1 else singletons).append(path)
+        return candidates, singletons
@@ -0,0 +1,74 @@
+import os
+import json
+import time
+import threading
+from tqdm import tqdm
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+class Progress:
+    """Rate-limited progress bars plus an optional newline-delimited JSON event stream.
+
+    Per-file output goes through `event()` instead of `print()`. When no event
+    log is configured `events` is False and callers skip building the event
+    entirely, so the disabled path costs one attribute check.
+    """
+
+    def __init__(self):
+        self.quiet = False
+        self.min_interval = 0.5
+        self.events = False
+        self.on_stage_end = None  # Optional `fn(name, start, end, fields)`, e.g. the trace exporter
+        self._stream = None
+        self._lock = threading.Lock()
+
+    def configure(self, quiet=False, event_log=None, min_interval=0.5):
+        self.close()
+        self.quiet = quiet
+        self.min_interval = min_interval
+        if event_log:
+            self._stream = open(event_log, "a", buffering=1024 * 1024, encoding="utf-8")
+            self.events = True
+
+    def bar(self, iterable, desc, total=None, unit="file"):
+        """Wraps `iterable` in a tqdm bar that redraws at most every `min_interval` seconds."""
+        return tqdm(iterable, desc=desc, total=total, unit=unit, mininterval=self.min_interval, disable=self.quiet)
+
+    def event(self, kind, **fields):
+        if not self.events:
+            return
+        line = json.dumps({"ts": time.time(), "event": kind, **fields}, ensure_ascii=False)
+        with self._lock:
+            self._stream.write(line + "\n")
+
+    def stage(self, name, **fields):
+        """Context manager emitting `stage_start`/`stage_end` events with wall time."""
+        return _Stage(self, name, fields)
+
+    def close(self):
+        if self._stream:
+            with self._lock:
+                self._stream.close()
+            self._stream = None
+            self.events = False
+
+class _Stage:
+    def __init__(self, progress, name, fields):
+        self.progress, self.name, self.fields = progress, name, fields
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.progress.event("stage_start", stage=self.name, **self.fields)
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.progress.event("stage_end", stage=self.name, seconds=round(end - self.start, 6), **self.fields)
+        if self.progress.on_stage_end:
+            self.progress.on_stage_end(self.name, self.start, end, self.fields)
+
+progress = Progress()
@@ -1,10 +1,26 @@
+import io
 import os
-import hashlib
+import json
 import shutil
-import concurrent.futures
+from functools import partial
 from PIL import Image
 from pillow_heif import register_heif_opener
-from tqdm import tqdm
+from hash_cache import open_cache
+from prefilter import SizePrefilter, singleton_key
+from backends import thread_map, hash_in_threads, hash_in_processes
+from pipeline import hash_in_pipeline
+from concurrency import AdaptiveConcurrency
+from pixel_hash import rgb_digest, timed_rgb_digest
+from bitstream import bitstream_digest, file_bitstream_digest
+from file_tiers import ByteIdentityTiers
+from perceptual import merge_near_duplicates
+from progress import progress, file_size
+from instrument import instrument, Laps, NOT_TIMED
+from materialize import Materializer, replace_file
+from external_sort import SpillSorter
+from compact_index import PathIndex, CompactIndexBuilder, merge_pairs
+from index_file import INDEX_SUFFIX, MappedIndex, is_index_file
+from bloom import BloomFilter, is_bloom_file
 
 # Register HEIF support
 register_heif_opener()
@@ -12,6 +28,77 @@ register_heif_opener()
 # Optimized thread count: Uses min(32, CPU cores * 2)
 MAX_THREADS = min(32, os.cpu_count() * 2)
 
+# Tune how many hashing and copying tasks are in flight at runtime from throughput, free
+# memory and I/O wait, starting at MAX_THREADS (threads backend; process pools stay fixed)
+ADAPTIVE_CONCURRENCY = False
+ADAPTIVE_MAX_THREADS = 128
+hash_workers = AdaptiveConcurrency(MAX_THREADS, ADAPTIVE_MAX_THREADS, name="hash workers")
+copy_workers = AdaptiveConcurrency(MAX_THREADS, ADAPTIVE_MAX_THREADS, name="copy workers")
+
+# Reuse hashes of unchanged files across runs (stored in the scanned folder)
+USE_HASH_CACHE = True
+
+# Only decode images whose dimensions are shared by at least one other image
+PREFILTER_BY_SIZE = False
+
+# Hashing backend: "threads", "processes" (sidesteps the GIL for decode-heavy HEIC sets) or
+# "pipeline" (I/O threads read files ahead while processes decode & hash the bytes)
+HASH_BACKEND = "threads"
+MAX_PROCESSES = os.cpu_count()
+PIPELINE_IO_THREADS = 16  # Reads in flight in "pipeline" mode (raise for NAS/NFS)
+
+# Rows per strip when hashing pixels (keeps peak memory low; 0 = whole image at once)
+HASH_STRIP_ROWS = 256
+
+# "pixel" decodes every image; "bitstream" hashes coded image data straight from the
+# container (JPEG, PNG, HEIC) and falls back to pixels otherwise. Hashes from the two modes
+# are not comparable, and bitstream mode only matches identically-encoded images.
+HASH_MODE = "pixel"
+
+# Skip pixel hashing for byte-identical copies (size → first 64KB → full file)
+BYTE_IDENTITY_TIERS = False
+
+# Treat images whose 64-bit dHash differs by at most this many bits as duplicates
+# (catches recompressed/resized copies). None = exact matches only.
+NEAR_DUP_RADIUS = None
+# "mih" (pure Python multi-index hash tables: ~5s for 100k and ~5 min for 1M images at
+# radius 6; larger radii cost more), "bktree" (pure Python, slower at scale) or "numpy"
+# (vectorized XOR + popcount, needs NumPy; all-pairs, best for small sets at large radii)
+NEAR_DUP_ENGINE = "mih"
+
+# Keep the hash → file index as packed binary digests with compressed paths (~4x smaller)
+COMPACT_INDEX = False
+
+# Spill hashes to sorted run files and k-way merge them instead of keeping the index
+# in memory (for corpora larger than RAM; exact matching and plain copies only)
+SPILL_TO_DISK = False
+SPILL_RUN_RECORDS = 1_000_000
+SPILL_DIR = None  # Temp directory for run files (None = system default)
+
+# Hide progress bars; per-file details go to an optional NDJSON event log (e.g. "events.ndjson")
+QUIET = False
+EVENT_LOG = None
+
+# Time open/decode/convert/tobytes/hash/copy per file and print p50/p90/p99 by extension
+# at exit (threads backend; process workers are not sampled). Optional raw samples CSV.
+INSTRUMENT = False
+INSTRUMENT_SAMPLES = None
+# Chrome trace-event JSON with one span per file per stage and per phase, by thread and
+# process (e.g. "trace.json", for ui.perfetto.dev); implies INSTRUMENT
+INSTRUMENT_TRACE = None
+
+# How output files are written: "copy" (default) writes independent copies; "auto" picks the
+# fastest independent copy per device pair (reflink → copy_file_range → copy); "hardlink"
+# (opt-in) makes outputs share the source photo's inode, so editing one edits both.
+COPY_STRATEGY = "copy"
+
+# "copy": each set folder gets its own copy of every image.
+# "store": each distinct image is written once into store/ and the set folders link to it.
+# "manifest": only write manifest.json describing the sets; no image data is touched.
+OUTPUT_MODE = "copy"
+# Link type used by "store" mode: "hardlink" or "symlink"
+STORE_LINK = "hardlink"
+
 def clean_up_videos(folder, video_output_folder):
     """Deletes MP4s if a matching HEIC exists & moves standalone MP4s/MOVs to videos/."""
     heic_files = {os.path.splitext(entry.name)[0] for entry in os.scandir(folder) if entry.name.lower().endswith('.heic')}
@@ -19,104 +106,448 @@ def clean_up_videos(folder, video_output_folder):
     os.makedirs(video_output_folder, exist_ok=True)
     files = list(os.scandir(folder))
 
-    for idx, entry in enumerate(tqdm(files, desc=f"🔍 Cleaning {folder}", unit="file")):
-        file_path = entry.path
-        file_base, file_ext = os.path.splitext(entry.name)
+    with progress.stage("clean_up_videos", folder=folder):
+        for entry in progress.bar(files, desc=f"🔍 Cleaning {folder}"):
+            file_path = entry.path
+            file_base, file_ext = os.path.splitext(entry.name)
 
-        if file_ext.lower() == ".mp4":
-            if file_base in heic_files:
-                os.remove(file_path)
-                print(f"[{idx+1}/{len(files)}] 🗑️ Deleted {entry.name} (HEIC exists)")
-            else:
-                shutil.move(file_path, os.path.join(video_output_folder, entry.name))
-                print(f"[{idx+1}/{len(files)}] 📂 Moved {entry.name} → {video_output_folder}")
+            if file_ext.lower() == ".mp4":
+                if file_base in heic_files:
+                    with instrument.timed("delete", file_path) if instrument.enabled else NOT_TIMED:
+                        os.remove(file_path)
+                    progress.event("video_deleted", path=file_path, reason="HEIC exists")
+                else:
+                    with instrument.timed("move", file_path) if instrument.enabled else NOT_TIMED:
+                        shutil.move(file_path, os.path.join(video_output_folder, entry.name))
+                    progress.event("video_moved", path=file_path, dest=video_output_folder)
 
-        elif file_ext.lower() == ".mov":
-            shutil.move(file_path, os.path.join(video_output_folder, entry.name))
-            print(f"[{idx+1}/{len(files)}] 📂 Moved {entry.name} → {video_output_folder}")
+            elif file_ext.lower() == ".mov":
+                with instrument.timed("move", file_path) if instrument.enabled else NOT_TIMED:
+                    shutil.move(file_path, os.path.join(video_output_folder, entry.name))
+                progress.event("video_moved", path=file_path, dest=video_output_folder)
 
-def get_image_hash(image_path):
-    """Compute a SHA-256 hash of an image's pixel data (ignoring metadata)."""
+def image_digest(image_path, mode=None):
+    """Returns the raw SHA-256 digest of an image's pixel data, or None if unreadable.
+
+    `mode` is the HASH_MODE to use (this script's when None).
+    """
+    mode = mode or HASH_MODE
+    if instrument.enabled:
+        return timed_image_digest(image_path, mode)
+    if mode == "bitstream":
+        try:
+            digest = file_bitstream_digest(image_path)
+        except OSError:
+            return None
+        if digest:
+            return digest
+    try:
+        with Image.open(image_path) as img:
+            return rgb_digest(img, HASH_STRIP_ROWS)
+    except Exception:
+        return None
+
+def buffer_digest(data, mode=None):
+    """`image_digest` for a file already read into memory (the "pipeline" backend's CPU stage)."""
+    if (mode or HASH_MODE) == "bitstream":
+        digest = bitstream_digest(data)
+        if digest:
+            return digest
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            return rgb_digest(img, HASH_STRIP_ROWS)
+    except Exception:
+        return None
+
+def timed_image_digest(image_path, mode):
+    """`image_digest` that records a sample for each stage it goes through."""
+    laps = Laps()
+    size = file_size(image_path) or 0
     try:
+        if mode == "bitstream":
+            try:
+                digest = file_bitstream_digest(image_path)
+            except OSError:
+                return None
+            laps.lap("bitstream", size)
+            if digest:
+                return digest
         with Image.open(image_path) as img:
-            img = img.convert("RGB")
-            return hashlib.sha256(img.tobytes()).hexdigest()
+            laps.lap("open", size)
+            return timed_rgb_digest(img, HASH_STRIP_ROWS, laps)
+    except Exception:
+        return None
+    finally:
+        instrument.record_laps(image_path, laps)
+
+def get_image_hash(image_path, cache=None, mode=None):
+    """Compute a SHA-256 hash of an image's pixel data (ignoring metadata)."""
+    try:
+        if cache:
+            cached, st = cache.get(image_path)
+            if cached:
+                return cached
+        digest = image_digest(image_path, mode)
+        if digest is None:
+            return None
+        img_hash = digest.hex()
+        if cache:
+            cache.put(st, img_hash)
+        return img_hash
     except Exception:
         return None
 
-def process_images(folder):
-    """Scans & hashes images with multithreading and progress tracking."""
-    image_hashes = {}
-    files = [entry for entry in os.scandir(folder) if entry.name.lower().endswith(('.heic', '.jpg', '.png'))]
+def iter_images(folder):
+    """Lazily yields the paths of all images directly inside `folder`."""
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name.lower().endswith(('.heic', '.jpg', '.png')):
+                yield entry.path
+
+def list_images(folder):
+    """Returns the paths of all images directly inside `folder`."""
+    return list(iter_images(folder))
+
+def select_images(folder, prefilter, byte_tiers, threads):
+    """Lists the images in `folder` that still need hashing after the grouping stages.
+
+    Returns `(files, singletons)`; singletons are images the size prefilter has
+    already resolved, to be indexed under `singleton_key(path)`. `byte_tiers`
+    and `threads` are the calling script's BYTE_IDENTITY_TIERS and MAX_THREADS.
+    """
+    files, singletons = iter_images(folder), []
+
+    if byte_tiers or prefilter:
+        # Grouping stages need the whole listing up front
+        files = list(files)
+
+    if byte_tiers:
+        tiers = ByteIdentityTiers(threads)
+        files = tiers.representatives(files)
+        print(tiers.summary())
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_THREADS) as executor:
-        futures = {executor.submit(get_image_hash, entry.path): entry.path for entry in files}
+    if prefilter:
+        files, singletons = prefilter.split(files)
+        print(f"📐 Size prefilter: {len(singletons)} images have unique dimensions, {len(files)} need hashing")
+    return files, singletons
 
-        for idx, future in enumerate(tqdm(concurrent.futures.as_completed(futures), desc=f"🔍 Hashing {folder}", total=len(files), unit="file")):
-            file_path = futures[future]
-            img_hash = future.result()
+def hash_files(files, cache, *, backend, mode, threads, processes, io_threads, controller=None):
+    """Yields `(path, hash)` pairs for `files` from a `backend` pool, in completion order.
+
+    The keyword arguments are the calling script's HASH_BACKEND, HASH_MODE,
+    MAX_THREADS, MAX_PROCESSES, PIPELINE_IO_THREADS and adaptive hash workers.
+    """
+    if backend == "processes":
+        return hash_in_processes(partial(image_digest, mode=mode), files, cache, processes)
+    if backend == "pipeline":
+        return hash_in_pipeline(partial(buffer_digest, mode=mode), files, cache, io_threads, processes)
+    return hash_in_threads(partial(get_image_hash, mode=mode), files, cache, threads, controller)
+
+def process_images(folder, *, prefilter=None, index=None):
+    """Scans & hashes images with multithreading and progress tracking.
+
+    `prefilter` is a SizePrefilter already scanned over both folders. Results go
+    into `index` (anything supporting `index[hash] = path`) when given.
+    """
+    if index is not None:
+        image_hashes = index
+    else:
+        image_hashes = CompactIndexBuilder() if COMPACT_INDEX else PathIndex()
+    files, singletons = select_images(folder, prefilter, BYTE_IDENTITY_TIERS, MAX_THREADS)
+    for file_path in singletons:
+        image_hashes[singleton_key(file_path)] = file_path
+
+    cache = open_cache(folder, HASH_MODE) if USE_HASH_CACHE else None
+    to_hash = len(files) if isinstance(files, list) else None
+
+    results = hash_files(
+        files, cache, backend=HASH_BACKEND, mode=HASH_MODE, threads=MAX_THREADS, processes=MAX_PROCESSES,
+        io_threads=PIPELINE_IO_THREADS, controller=hash_workers if ADAPTIVE_CONCURRENCY else None,
+    )
+
+    hashed = 0
+    with progress.stage("hash", folder=folder):
+        for file_path, img_hash in progress.bar(results, desc=f"🔍 Hashing {folder}", total=to_hash):
+            hashed += 1
             if img_hash:
                 image_hashes[img_hash] = file_path
-            print(f"[{idx+1}/{len(files)}] 🖼️ Hashed {os.path.basename(file_path)}")
+            if progress.events:
+                progress.event("hashed", path=file_path, hash=img_hash, bytes=file_size(file_path))
+
+    if cache:
+        cache.close()
+        print(cache.summary())
+    if ADAPTIVE_CONCURRENCY and HASH_BACKEND == "threads":
+        print(hash_workers.summary())
+
+    if isinstance(image_hashes, CompactIndexBuilder):
+        image_hashes = image_hashes.build()
 
     return image_hashes
 
-def copy_image(src, dest_folder, idx, total):
-    """Copies an image with progress tracking."""
+_materializers = {}
+
+def materializer():
+    """The Materializer for the current COPY_STRATEGY (read at call time, like the other flags)."""
+    writer = _materializers.get(COPY_STRATEGY)
+    if writer is None:
+        writer = _materializers.setdefault(COPY_STRATEGY, Materializer(COPY_STRATEGY))
+    return writer
+
+def copy_image(src, dest_folder, idx, total, write=None):
+    """Copies an image with progress tracking (through `write`, this script's materializer if None)."""
     os.makedirs(dest_folder, exist_ok=True)
-    shutil.copy2(src, os.path.join(dest_folder, os.path.basename(src)))
-    print(f"[{idx+1}/{total}] ✅ Copied {os.path.basename(src)} → {dest_folder}")
+    write = write or materializer()
+    with instrument.timed("copy", src) if instrument.enabled else NOT_TIMED:
+        write(src, os.path.join(dest_folder, os.path.basename(src)))
+    if progress.events:
+        progress.event("copied", path=src, dest=dest_folder, index=idx, total=total, bytes=file_size(src))
+
+def link_image(store_path, dest_folder, name):
+    """Adds `store_path` to a set folder as a hardlink or relative symlink called `name`."""
+    dest = os.path.join(dest_folder, name)
+    if STORE_LINK == "symlink":
+        replace_file(lambda src, dest: os.symlink(os.path.relpath(src, dest_folder), dest), store_path, dest)
+    else:
+        replace_file(os.link, store_path, dest)
+
+def write_manifest(sets, output_folder):
+    """Writes `{set name: {hash: source path}}` to manifest.json."""
+    os.makedirs(output_folder, exist_ok=True)
+    manifest_path = os.path.join(output_folder, "manifest.json")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(sets, f, indent=1, ensure_ascii=False)
+    return manifest_path
+
+SET_LABELS = ("A-B", "B-A", "A∩B", "A∪B")
+
+def set_members(path_a, path_b):
+    """Yields `(path, set label)` for an image found at `path_a` in A and/or `path_b` in B (None where missing).
+
+    A∩B keeps A's copy and A∪B keeps B's, as the sets always have; only duplicates
+    within one folder are decided by path (see PathIndex).
+    """
+    if path_b is None:
+        yield path_a, "A-B"
+    elif path_a is None:
+        yield path_b, "B-A"
+    else:
+        yield path_a, "A∩B"
+    yield path_b or path_a, "A∪B"
+
+def link_into_sets(pairs, folders, store_folder):
+    """Materializes each distinct image of `(hash, path_a, path_b)` once into `store_folder`,
+    then links it into every set folder it belongs to."""
+    os.makedirs(store_folder, exist_ok=True)
+
+    def store_and_link(pair):
+        h, path_a, path_b = pair
+        members = [(path, label) for path, label in set_members(path_a, path_b) if label in folders]
+        source = members[-1][0]  # The A∪B copy when that set is written
+        stored = os.path.join(store_folder, h + os.path.splitext(source)[1].lower())
+        materializer()(source, stored)
+        for path, label in members:
+            link_image(stored, folders[label], os.path.basename(path))
+
+    with progress.stage("store", folder=store_folder):
+        stores = thread_map(store_and_link, pairs, MAX_THREADS, copy_workers if ADAPTIVE_CONCURRENCY else None)
+        for _ in progress.bar(stores, desc=f"📦 Storing in {store_folder}"):
+            pass
+
+def load_images(folder_or_index, prefilter=None):
+    """Hashes a folder, or opens a prebuilt index file (see build_index.py) without rescanning."""
+    if is_index_file(folder_or_index):
+        index = MappedIndex(folder_or_index)
+        if index.mode != HASH_MODE:
+            raise ValueError(f"{folder_or_index} was built with HASH_MODE={index.mode!r}, not {HASH_MODE!r}")
+        print(f"📇 Using index {folder_or_index} ({len(index)} images)")
+        return index
+    return process_images(folder_or_index, prefilter=prefilter)
+
+def copy_sets(tasks):
+    """Copies `dataset[h]` for every hash `h` of each `(label, dataset, target_folder)` task."""
+    for label, dataset, target_folder in tasks:
+        os.makedirs(target_folder, exist_ok=True)
+        with progress.stage("copy", folder=target_folder):
+            copies = thread_map(lambda item: copy_image(dataset[item[1]], target_folder, item[0], len(dataset)), enumerate(label), MAX_THREADS, copy_workers if ADAPTIVE_CONCURRENCY else None)
+            for _ in progress.bar(copies, desc=f"📁 Copying to {target_folder}", total=len(label)):
+                pass
+
+def check_intake(folder_a, bloom_path, output_folder):
+    """Sorts folder A against an archive's Bloom filter (see build_index.py) to find A-B.
+
+    Only A is hashed. Filter negatives are certainly not in the archive; positives
+    are confirmed against the archive's .phidx index when it sits next to the
+    filter, and are otherwise reported as probably present.
+    """
+    bloom = BloomFilter.load(bloom_path)
+    if bloom.mode != HASH_MODE:
+        raise ValueError(f"{bloom_path} was built with HASH_MODE={bloom.mode!r}, not {HASH_MODE!r}")
 
-def compare_images_and_sort(folder_a, folder_b, output_folder):
-    """Finds matching & unique images between two folders & sorts them."""
     print("\n🔍 Hashing images in Folder A...")
-    images_a = process_images(folder_a)
-    
-    print("\n🔍 Hashing images in Folder B...")
-    images_b = process_images(folder_b)
+    images_a = process_images(folder_a)  # No size prefilter: its stand-in keys never match an archive
+
+    only_in_a, maybe_in_b, intersection = set(), set(), set()
+    for h in images_a:
+        (maybe_in_b if h in bloom else only_in_a).add(h)
+
+    index_path = os.path.splitext(bloom_path)[0] + INDEX_SUFFIX
+    if maybe_in_b and os.path.isfile(index_path):
+        index = MappedIndex(index_path)
+        for h in maybe_in_b:
+            (intersection if h in index else only_in_a).add(h)
+        maybe_in_b = set()
+        index.close()
+
+    tasks = [
+        (only_in_a, images_a, os.path.join(output_folder, "A-B")),
+        (intersection, images_a, os.path.join(output_folder, "A_intersection_B")),
+        (maybe_in_b, images_a, os.path.join(output_folder, "A_maybe_in_B")),
+    ]
+    copy_sets([task for task in tasks if task[0]])
+
+    print("\n✅ Intake check complete!")
+    print(f"📂 New images (A-B): {len(only_in_a)}")
+    print(f"📂 Already in archive: {len(intersection)}")
+    if maybe_in_b:
+        print(f"❓ Probably in archive (no {index_path} to confirm): {len(maybe_in_b)}")
+    print(materializer().summary())
+    if ADAPTIVE_CONCURRENCY:
+        print(copy_workers.summary())
 
-    intersection = {h for h in images_a if h in images_b}
-    only_in_a = {h for h in images_a if h not in images_b}
-    only_in_b = {h for h in images_b if h not in images_a}
-    union = images_a.keys() | images_b.keys()
+def copy_set_members(pairs, folders, output_folder):
+    """Copies every image of `(path_a, path_b)` pairs into its set folders in one pool,
+    then prints how many images each set received."""
+    copies = enumerate((path, folders[label]) for path_a, path_b in pairs for path, label in set_members(path_a, path_b) if label in folders)
+    counts = dict.fromkeys(folders.values(), 0)
+    with progress.stage("copy", folder=output_folder):
+        results = thread_map(lambda item: copy_image(item[1][0], item[1][1], item[0], None), copies, MAX_THREADS, copy_workers if ADAPTIVE_CONCURRENCY else None)
+        for (_, (_, target_folder)), _ in progress.bar(results, desc=f"📁 Copying to {output_folder}"):
+            counts[target_folder] += 1
 
+    print("\n✅ Sorting complete! Images have been copied.")
+    for label in SET_LABELS:
+        if label in folders:
+            print(f"📂 {label}: {counts[folders[label]]}")
+    print(materializer().summary())
+    if ADAPTIVE_CONCURRENCY:
+        print(copy_workers.summary())
+
+def set_folders(output_folder, labels=SET_LABELS):
+    """Creates the folders of the sets in `labels` under `output_folder` and returns them by label."""
     folders = {
         "A-B": os.path.join(output_folder, "A-B"),
         "B-A": os.path.join(output_folder, "B-A"),
         "A∩B": os.path.join(output_folder, "A_intersection_B"),
         "A∪B": os.path.join(output_folder, "A_union_B"),
-        "Videos": os.path.join(output_folder, "A_intersection_B", "videos"),
     }
-
+    folders = {label: folder for label, folder in folders.items() if label in labels}
+    folders["Videos"] = os.path.join(output_folder, "A_intersection_B", "videos")
     for folder in folders.values():
         os.makedirs(folder, exist_ok=True)
+    return folders
 
-    tasks = [
-        (only_in_a, images_a, folders["A-B"]),
-        (only_in_b, images_b, folders["B-A"]),
-        (intersection, images_a, folders["A∩B"]),
-        (union, {**images_a, **images_b}, folders["A∪B"]),
-    ]
+def compare_spilled(folder_a, folder_b, output_folder, prefilter=None):
+    """`compare_images_and_sort` with bounded memory: both folders are hashed into sorted
+    run files, and the sets are copied in one streaming pass over their k-way merge."""
+    folders = set_folders(output_folder)
+    sorter = SpillSorter(SPILL_RUN_RECORDS, SPILL_DIR)
+    try:
+        print("\n🔍 Hashing images in Folder A...")
+        process_images(folder_a, prefilter=prefilter, index=sorter.writer(0))
+        print("\n🔍 Hashing images in Folder B...")
+        process_images(folder_b, prefilter=prefilter, index=sorter.writer(1))
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_THREADS) as executor:
-        for label, dataset, target_folder in tasks:
-            futures = {executor.submit(copy_image, dataset[h], target_folder, idx, len(dataset)) for idx, h in enumerate(label)}
-            for future in concurrent.futures.as_completed(futures):
-                future.result()
+        # Source 0 is A and source 1 is B; members are sorted by path, so each side's smallest path wins
+        pairs = ((next((path for source, path in members if source == 0), None),
+                  next((path for source, path in members if source == 1), None))
+                 for _, members in sorter.groups())
+        copy_set_members(pairs, folders, output_folder)
+    finally:
+        sorter.close()
 
-    print("\n✅ Sorting complete! Images have been copied.")
+def compare_images_and_sort(folder_a, folder_b, output_folder):
+    """Finds matching & unique images between two folders (or index files) & sorts them."""
+    if NEAR_DUP_RADIUS is not None and (is_index_file(folder_a) or is_index_file(folder_b) or is_bloom_file(folder_b)):
+        # Index files only hold exact hashes; near-duplicate matching would have to decode every archived image
+        raise ValueError("NEAR_DUP_RADIUS needs two folders; index and Bloom filter files only support exact matching")
+    if is_bloom_file(folder_b):
+        return check_intake(folder_a, folder_b, output_folder)
+
+    prefilter = None
+    if PREFILTER_BY_SIZE and not (is_index_file(folder_a) or is_index_file(folder_b)):
+        # Sizes are counted across both folders so cross-folder twins are still hashed
+        prefilter = SizePrefilter(MAX_THREADS)
+        prefilter.scan(list_images(folder_a) + list_images(folder_b))
+
+    if SPILL_TO_DISK and not (is_index_file(folder_a) or is_index_file(folder_b)):
+        return compare_spilled(folder_a, folder_b, output_folder, prefilter)
+
+    print("\n🔍 Hashing images in Folder A...")
+    images_a = load_images(folder_a, prefilter)
+    
+    print("\n🔍 Hashing images in Folder B...")
+    images_b = load_images(folder_b, prefilter)
+    indexes = [images for images in (images_a, images_b) if isinstance(images, MappedIndex)]
+
+    # An index file stands for an archive: sets made of its own images (its side's
+    # difference and the union) would copy the whole archive, so they are skipped
+    # and the index is only probed with lookups
+    only_a, only_b = not isinstance(images_a, MappedIndex), not isinstance(images_b, MappedIndex)
+    labels = [label for label, keep in zip(SET_LABELS, (only_a, only_b, True, only_a and only_b)) if keep]
+    if len(labels) < len(SET_LABELS):
+        print(f"📇 Index file given: skipping {', '.join(label for label in SET_LABELS if label not in labels)}")
+
+    try:
+        if NEAR_DUP_RADIUS is not None:
+            print(f"\n🔍 Matching near-duplicates (radius {NEAR_DUP_RADIUS} bits)...")
+            images_a, images_b = merge_near_duplicates([images_a, images_b], NEAR_DUP_RADIUS, MAX_THREADS, NEAR_DUP_ENGINE)
+
+        pairs = merge_pairs(images_a, images_b, only_a, only_b)
+
+        if OUTPUT_MODE == "manifest":
+            sets = {label: {} for label in labels}
+            for h, path_a, path_b in pairs:
+                for path, label in set_members(path_a, path_b):
+                    if label in sets:
+                        sets[label][h] = path
+            manifest_path = write_manifest(sets, output_folder)
+            print(f"\n✅ Sorting complete! Sets written to {manifest_path}.")
+            return
+
+        folders = set_folders(output_folder, labels)
+
+        if OUTPUT_MODE == "store":
+            link_into_sets(pairs, folders, os.path.join(output_folder, "store"))
+            print("\n✅ Sorting complete! Images were stored once and linked into each set.")
+            print(materializer().summary())
+            if ADAPTIVE_CONCURRENCY:
+                print(copy_workers.summary())
+            return
+
+        copy_set_members(((path_a, path_b) for _, path_a, path_b in pairs), folders, output_folder)
+    finally:
+        for index in indexes:
+            index.close()
 
 if __name__ == "__main__":
+    # Either side may also be an index file built with build_index.py, e.g. "./archive.phidx";
+    # B may be an archive's Bloom filter ("./archive.bloom") to only compute A-B
     folder_a = "./A"
     folder_b = "./B"
     output_folder = "output"
 
     if os.path.exists(folder_a) and os.path.exists(folder_b):
+        progress.configure(QUIET, EVENT_LOG)
+        instrument.configure(INSTRUMENT, INSTRUMENT_SAMPLES, INSTRUMENT_TRACE)
+
         print("\n🔍 Step 1: Cleaning up videos (MP4 & MOV files)...")
-        clean_up_videos(folder_a, os.path.join(output_folder, "A_intersection_B", "videos"))
-        clean_up_videos(folder_b, os.path.join(output_folder, "A_intersection_B", "videos"))
+        for folder in (folder_a, folder_b):
+            if os.path.isdir(folder):
+                clean_up_videos(folder, os.path.join(output_folder, "A_intersection_B", "videos"))
 
         print("\n🔍 Step 2: Comparing and categorizing images...")
         compare_images_and_sort(folder_a, folder_b, output_folder)
+        progress.close()
     else:
         print("Error: One or both folders do not exist.")